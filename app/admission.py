@@ -0,0 +1,213 @@
+#admission.py caps how many DB-bound requests run at once so bursts queue briefly
+#in memory instead of piling up on SessionLocal's pool and timing out late.
+#
+# Requests are grouped into route classes. Each class has a concurrency cap,
+# a bounded wait queue and a deadline. The last checkout_reserve slots are
+# held for checkout: other classes only start while fewer than
+# capacity - checkout_reserve requests are running. When a slot frees up the
+# waiting request with the best priority goes first (checkout before reads
+# before reports). A request that can't be queued, or waits past its deadline, gets
+# 503 with Retry-After right away.
+import asyncio
+import itertools
+import json
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ENABLED = os.getenv("admission_control", "on").lower() not in ("off", "0", "false")
+
+
+@dataclass
+class RouteClass:
+    name: str
+    priority: int  # lower goes first
+    max_concurrency: int
+    max_queue: int
+    max_wait: float  # seconds
+    pool_limit: int  # runs only while fewer than this many slots are in use overall
+    active: int = 0
+    admitted: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+    max_queue_seen: int = 0
+    waiting: List["_Waiter"] = field(default_factory=list)
+
+
+@dataclass
+class _Waiter:
+    route_class: RouteClass
+    seq: int
+    future: asyncio.Future
+
+
+# Not DB-bound (or dispatching to routes that are admitted on their own)
+EXEMPT_PATHS = ("/", "/docs", "/redoc", "/openapi.json", "/batch", "/user-info", "/upload-image")
+EXEMPT_PREFIXES = ("/health", "/metrics", "/docs", "/local-storage", "/profiles")
+
+CHECKOUT_ROUTES = {("POST", "/orders"), ("POST", "/order-payments")}
+REPORT_PATHS = {
+    "/total-payments", "/service-payments", "/reconciliation",
+    "/products/count", "/sold/count", "/sync", "/restock", "/stock",
+}
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    if method == "OPTIONS" or path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if (method, path) in CHECKOUT_ROUTES:
+        return "checkout"
+    if method != "GET":
+        return "write"
+    if path in REPORT_PATHS:
+        return "report"
+    return "read"
+
+
+class AdmissionController:
+    def __init__(self, capacity: int, checkout_reserve: int = 1):
+        self.capacity = capacity
+        self.in_use = 0
+        self._seq = itertools.count()
+        shared = max(1, capacity - checkout_reserve)
+        self.classes: Dict[str, RouteClass] = {
+            "checkout": RouteClass("checkout", 0, capacity, max_queue=4 * capacity, max_wait=10.0, pool_limit=capacity),
+            "write": RouteClass("write", 1, shared, max_queue=2 * capacity, max_wait=5.0, pool_limit=shared),
+            "read": RouteClass("read", 2, shared, max_queue=2 * capacity, max_wait=3.0, pool_limit=shared),
+            "report": RouteClass("report", 3, max(1, capacity // 4), max_queue=capacity, max_wait=2.0, pool_limit=shared),
+        }
+
+    def _can_run(self, route_class: RouteClass) -> bool:
+        # The last checkout_reserve slots of the pool are only for checkout
+        return self.in_use < route_class.pool_limit and route_class.active < route_class.max_concurrency
+
+    def _start(self, route_class: RouteClass):
+        self.in_use += 1
+        route_class.active += 1
+        route_class.admitted += 1
+
+    def _queued(self) -> int:
+        return sum(len(c.waiting) for c in self.classes.values())
+
+    async def acquire(self, name: str) -> bool:
+        route_class = self.classes[name]
+        ahead = any(
+            c.waiting for c in self.classes.values() if c.priority <= route_class.priority
+        )
+        if not ahead and self._can_run(route_class):
+            self._start(route_class)
+            return True
+        if len(route_class.waiting) >= route_class.max_queue:
+            route_class.rejected += 1
+            return False
+
+        waiter = _Waiter(route_class, next(self._seq), asyncio.get_running_loop().create_future())
+        route_class.waiting.append(waiter)
+        route_class.max_queue_seen = max(route_class.max_queue_seen, len(route_class.waiting))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), route_class.max_wait)
+            return True
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                # Admitted in the same tick the deadline fired; keep the slot
+                return True
+            route_class.waiting.remove(waiter)
+            route_class.timed_out += 1
+            route_class.rejected += 1
+            return False
+        except asyncio.CancelledError:
+            # Client went away while queued; hand back the slot if we got one
+            if waiter.future.done():
+                self.release(name)
+            elif waiter in route_class.waiting:
+                route_class.waiting.remove(waiter)
+            raise
+
+    def release(self, name: str):
+        route_class = self.classes[name]
+        self.in_use -= 1
+        route_class.active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.in_use < self.capacity:
+            candidates = [
+                c.waiting[0] for c in self.classes.values()
+                if c.waiting and self._can_run(c)
+            ]
+            if not candidates:
+                return
+            waiter = min(candidates, key=lambda w: (w.route_class.priority, w.seq))
+            waiter.route_class.waiting.pop(0)
+            self._start(waiter.route_class)
+            waiter.future.set_result(True)
+
+    def retry_after(self, name: str) -> int:
+        return max(1, math.ceil(self.classes[name].max_wait))
+
+    def metrics(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "queued": self._queued(),
+            "classes": {
+                name: {
+                    "priority": c.priority,
+                    "max_concurrency": c.max_concurrency,
+                    "active": c.active,
+                    "queue_depth": len(c.waiting),
+                    "max_queue_depth": c.max_queue_seen,
+                    "admitted": c.admitted,
+                    "rejected": c.rejected,
+                    "timed_out": c.timed_out,
+                }
+                for name, c in self.classes.items()
+            },
+        }
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = classify(scope["method"], scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        if not await self.controller.acquire(name):
+            await self._reject(send, name, time.monotonic() - started)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(name)
+
+    async def _reject(self, send, name: str, waited: float):
+        body = json.dumps({
+            "detail": "Server is busy, please retry",
+            "route_class": name,
+            "waited_seconds": round(waited, 3),
+        }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.controller.retry_after(name)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,118 @@
+#archive.py moves closed, fully paid orders out of the hot order tables.
+#
+# Orders older than the retention window whose payments cover the total are
+# copied to orders_archive / order_items_archive / order_payments_archive and
+# deleted from the hot tables in the same transaction, one batch at a time.
+# List/count/total queries read the archive only when asked
+# (include_archived=True). The items-sold and payments counters move from
+# their hot to their archived names in the same transaction, and /sync gets
+# a delete for every archived order and payment.
+from sqlalchemy import String, and_, delete, func, insert, literal, select, text
+from sqlalchemy.orm import Session
+
+import changes
+import crud.counter_crud as counter_crud
+from models import (
+    ChangeLog, Order, OrderItem, OrderPayment,
+    OrderArchive, OrderItemArchive, OrderPaymentArchive,
+)
+
+CLOSED_STATUSES = ("complete", "paid")
+
+# hot table -> archive table, children before parents for deletes
+_MOVES = [
+    (Order.__table__, OrderArchive.__table__),
+    (OrderItem.__table__, OrderItemArchive.__table__),
+    (OrderPayment.__table__, OrderPaymentArchive.__table__),
+]
+
+
+def archivable_order_ids(db: Session, older_than_months: int, limit: int):
+    paid = (
+        select(func.coalesce(func.sum(OrderPayment.amount), 0.0))
+        .where(OrderPayment.order_id == Order.order_id)
+        .scalar_subquery()
+    )
+    stmt = (
+        select(Order.order_id)
+        .where(
+            and_(
+                Order.order_date < func.now() - func.make_interval(0, older_than_months),
+                Order.payment_status.in_(CLOSED_STATUSES),
+                paid >= Order.total_price,
+            )
+        )
+        .order_by(Order.order_date)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return list(db.execute(stmt).scalars())
+
+
+def _move_counters(db: Session, order_ids):
+    items = select(OrderItem.store_id, func.count()).where(
+        OrderItem.order_id.in_(order_ids)
+    ).group_by(OrderItem.store_id)
+    for store_id, count in db.execute(items):
+        counter_crud.move(db, store_id, counter_crud.ITEMS_SOLD, counter_crud.ITEMS_SOLD_ARCHIVED, count)
+    payments = select(OrderPayment.store_id, func.sum(OrderPayment.amount)).where(
+        OrderPayment.order_id.in_(order_ids)
+    ).group_by(OrderPayment.store_id)
+    for store_id, total in db.execute(payments):
+        counter_crud.move(db, store_id, counter_crud.PAYMENTS_TOTAL, counter_crud.PAYMENTS_TOTAL_ARCHIVED, total)
+
+
+def _write_tombstones(db: Session, order_ids):
+    # The Core deletes below bypass the change_log writer (changes.py). An
+    # order's items travel with the order, so its delete covers them too.
+    for model, key in ((Order, Order.order_id), (OrderPayment, OrderPayment.payment_id)):
+        db.execute(
+            insert(ChangeLog.__table__).from_select(
+                ["entity", "entity_id", "store_id", "op"],
+                select(
+                    literal(changes.ENTITY_NAMES[model], String), key, model.store_id,
+                    literal(changes.DELETE, String),
+                ).where(model.order_id.in_(order_ids)),
+            )
+        )
+
+
+def _copy_and_delete(db: Session, order_ids):
+    _move_counters(db, order_ids)
+    _write_tombstones(db, order_ids)
+    for hot, archive in _MOVES:
+        columns = [c for c in hot.columns if c.name in archive.columns]
+        db.execute(
+            insert(archive).from_select(
+                [c.name for c in columns],
+                select(*columns).where(hot.c.order_id.in_(order_ids)),
+            )
+        )
+    for hot, _ in reversed(_MOVES):
+        db.execute(delete(hot).where(hot.c.order_id.in_(order_ids)))
+
+
+def archive_orders(db: Session, older_than_months: int = 12, batch_size: int = 1000) -> int:
+    """Archive eligible orders in batches; returns how many were moved."""
+    moved = 0
+    while True:
+        order_ids = archivable_order_ids(db, older_than_months, batch_size)
+        if not order_ids:
+            break
+        try:
+            _copy_and_delete(db, order_ids)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        moved += len(order_ids)
+        if len(order_ids) < batch_size:
+            break
+    return moved
+
+
+def vacuum_hot_tables(engine):
+    """Reclaim space in the hot tables after a large archive run."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for hot, _ in _MOVES:
+            conn.execute(text(f"VACUUM ANALYZE {hot.name}"))
@@ -0,0 +1,75 @@
+#batch.py runs several GET sub-requests against the app in-process, concurrently,
+#so a POS screen load is one round trip instead of five.
+import asyncio
+import json
+from typing import Dict, List, Optional
+
+import httpx
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+
+MAX_BATCH_SIZE = 20
+# Headers from the outer request that sub-requests inherit
+FORWARDED_HEADERS = ("authorization", "accept-language", "x-store-id", "x-store-key")
+
+
+class BatchSubRequest(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str
+    params: Dict[str, str] = {}
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest] = Field(..., min_length=1)
+
+
+class BatchSubResponse(BaseModel):
+    id: Optional[str] = None
+    status: int
+    body: object = None
+
+
+class BatchResponse(BaseModel):
+    responses: List[BatchSubResponse]
+
+
+def validate_batch(batch: BatchRequest):
+    if len(batch.requests) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} requests per batch")
+    for sub in batch.requests:
+        if sub.method.upper() != "GET":
+            raise HTTPException(status_code=400, detail="Only GET requests can be batched")
+        if not sub.path.startswith("/") or sub.path.rstrip("/") == "/batch":
+            raise HTTPException(status_code=400, detail=f"Invalid batch path: {sub.path}")
+
+
+def _decode(response: httpx.Response):
+    if response.headers.get("content-type", "").startswith("application/json"):
+        try:
+            return response.json()
+        except json.JSONDecodeError:
+            pass
+    return response.text
+
+
+async def run_batch(app, batch: BatchRequest, headers) -> BatchResponse:
+    """Dispatch every sub-request to app through its own ASGI call.
+
+    Each sub-request goes through the normal routing, validation and
+    middleware, and gets its own pooled DB session. A Session is not safe
+    to share between requests running at the same time.
+    """
+    validate_batch(batch)
+    forwarded = {k: v for k, v in headers.items() if k.lower() in FORWARDED_HEADERS}
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://batch", headers=forwarded) as client:
+        responses = await asyncio.gather(
+            *(client.get(sub.path, params=sub.params) for sub in batch.requests)
+        )
+
+    return BatchResponse(responses=[
+        BatchSubResponse(id=sub.id, status=response.status_code, body=_decode(response))
+        for sub, response in zip(batch.requests, responses)
+    ])
@@ -0,0 +1,79 @@
+#compression.py measures payload size and per-request latency for /products-
+#and /orders-shaped JSON: uncompressed, compressed on every request, and
+#served pre-compressed from the response cache. No database needed.
+#
+#   cd app && python -m benchmarks.compression --products 500 --orders 5000
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+
+from response_cache import CachedPayload, brotli, compress
+
+
+def products_payload(n: int) -> bytes:
+    now = datetime.now().isoformat()
+    return json.dumps([{
+        "product_id": p,
+        "name": f"Classic Tee {p}",
+        "description": "100% cotton crew neck",
+        "color": random.choice(["black", "white", "red", "navy", "heather grey"]),
+        "image_url": f"https://example.supabase.co/storage/v1/object/public/images/product_images/{p}.jpg",
+        "created_at": now,
+        "variants": [{
+            "variant_id": p * 10 + i, "product_id": p, "size": size, "quantity": random.randint(0, 80),
+            "selling_price": 350.0, "item_cost": 180.0, "updated_at": now,
+        } for i, size in enumerate(["S", "M", "L", "XL"])],
+    } for p in range(n)]).encode()
+
+
+def orders_payload(n: int) -> bytes:
+    now = datetime.now().isoformat()
+    return json.dumps([{
+        "order_id": o, "order_date": now, "total_price": 820.0, "payment_status": "complete",
+        "items": [{"order_item_id": o * 3 + i, "order_id": o, "product_id": i + 1, "service_id": None,
+                   "variant_id": i + 10, "quantity": 2, "price": 350.0} for i in range(2)],
+        "payments": [{"payment_id": o, "order_id": o, "amount": 820.0, "payment_date": now,
+                      "status": "completed", "created_at": now, "updated_at": now}],
+    } for o in range(n)]).encode()
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def report(name: str, body: bytes, repeat: int):
+    print(f"\n{name}: {len(body) / 1024:.1f} KiB identity")
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    cached = CachedPayload(body, version=1)
+    for encoding in encodings:
+        size = len(compress(body, encoding))
+        per_request = timed(lambda: compress(body, encoding), repeat)
+        cached.encoded(encoding)  # warm
+        from_cache = timed(lambda: cached.encoded(encoding), repeat * 100)
+        print(
+            f"  {encoding:<5} {size / 1024:8.1f} KiB ({100 * size / len(body):4.1f}%)  "
+            f"compress per request {per_request:7.2f} ms  from cache {from_cache * 1000:6.2f} us"
+        )
+    if brotli is None:
+        print("  (pip install brotli to include br)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(0)
+    report("/products", products_payload(args.products), args.repeat)
+    report("/orders", orders_payload(args.orders), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#crud_statements.py is a micro-benchmark of the CPU SQLAlchemy spends turning
+#the hot CRUD queries into SQL: building the statement, adding the store
+#criteria, computing its cache key and looking up (or compiling) the SQL.
+#Statements built on every call (the old db.query(...) style) are compared
+#with the prebuilt ones in crud/. Nothing is sent to the database, so there is
+#no dataset: the numbers are the SQL-building share of a request on this
+#machine, not endpoint latency (use benchmarks.worker_scaling for that).
+#database.py still reads the connection settings from .env on import.
+#
+#   cd app && python -m benchmarks.crud_statements --repeat 20000
+import argparse
+import time
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session, joinedload, with_loader_criteria
+
+import crud.order_crud as ocrud
+import crud.product_crud as pcrud
+import stores
+from models import OrderPayment, Product, Variant
+
+DIALECT = postgresql.dialect()
+STORE_ID = 1
+
+
+def per_call_criteria():
+    # What stores.py built for every statement before store_criteria()
+    return [
+        with_loader_criteria(model, lambda cls: cls.store_id == STORE_ID, include_aliases=True)
+        for model in stores.STORE_SCOPED
+    ]
+
+
+# request -> (statements built per call, prebuilt statements)
+def paths(db: Session):
+    return {
+        "get_products": (
+            lambda: [db.query(Product).options(joinedload(Product.variants)).statement],
+            lambda: [pcrud.PRODUCTS_WITH_VARIANTS],
+        ),
+        "create_order": (
+            lambda: [
+                db.query(Variant).filter(Variant.variant_id.in_([3, 7, 11]))
+                .order_by(Variant.variant_id).with_for_update().statement
+            ],
+            lambda: [ocrud.LOCK_VARIANTS],
+        ),
+        # The order itself is loaded by primary key (Session.get) either way
+        "create_order_payment": (
+            lambda: [db.query(OrderPayment).filter(OrderPayment.order_id == 42).statement],
+            lambda: [ocrud.PAID_SO_FAR],
+        ),
+    }
+
+
+def to_sql(statements, criteria, cache):
+    """What Session.execute does before the driver sees the SQL."""
+    for statement in statements:
+        statement = statement.options(*criteria())
+        key = statement._generate_cache_key().key
+        if key not in cache:
+            cache[key] = statement.compile(dialect=DIALECT)
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5000)
+    args = parser.parse_args()
+
+    db = Session()
+    print("Micro-benchmark: CPU spent producing SQL, no queries run (compiled SQL cache warm)")
+    for name, (per_call, prebuilt) in paths(db).items():
+        before_cache, after_cache = {}, {}
+        before = timed(lambda: to_sql(per_call(), per_call_criteria, before_cache), args.repeat)
+        after = timed(lambda: to_sql(prebuilt(), lambda: stores.store_criteria(STORE_ID), after_cache), args.repeat)
+        uncached = timed(lambda: to_sql(prebuilt(), lambda: stores.store_criteria(STORE_ID), {}), max(1, args.repeat // 20))
+        print(
+            f"  {name:<22} per call {before * 1e6:7.1f} us  prebuilt {after * 1e6:7.1f} us  "
+            f"({100 * (1 - after / before):4.1f}% less)  without the SQL cache {uncached * 1e6:7.1f} us"
+        )
+        # The prebuilt statements must hit the cache (one entry per statement)
+        assert len(after_cache) == len(prebuilt()), f"{name}: cache misses on prebuilt statements"
+    print("\nWith db_driver=psycopg the SQL text of the prebuilt statements is stable,")
+    print("so Postgres also skips parsing and planning them once they are prepared.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#order_validation.py measures how fast POST /orders bodies are validated for
+#carts of increasing size: from a parsed dict (as FastAPI hands it over) and
+#straight from the raw JSON bytes. No database needed.
+#
+#   cd app && python -m benchmarks.order_validation --items 10 100 1000
+import argparse
+import json
+import random
+import time
+
+import schemas
+
+
+def order_payload(items: int) -> dict:
+    cart = []
+    for i in range(items):
+        if random.random() < 0.8:
+            cart.append({"product_id": i + 1, "variant_id": i * 4 + 1, "quantity": random.randint(1, 3), "price": 350.0})
+        else:
+            cart.append({"service_id": i + 1, "quantity": 1, "price": 120.0})
+    discount = 50.0
+    total = sum(item["price"] * item["quantity"] for item in cart) - discount
+    return {"items": cart, "discount": discount, "total_price": total}
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def report(items: int, repeat: int):
+    payload = order_payload(items)
+    body = json.dumps(payload).encode()
+    from_dict = timed(lambda: schemas.OrderCreate.model_validate(payload), repeat)
+    from_json = timed(lambda: schemas.OrderCreate.model_validate_json(body), repeat)
+    print(
+        f"  {items:>6} items  dict {from_dict * 1e6:9.1f} us ({items / from_dict / 1e6:5.2f} M items/s)  "
+        f"json {from_json * 1e6:9.1f} us ({items / from_json / 1e6:5.2f} M items/s)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=0, help="runs per size (default: ~100k items worth)")
+    args = parser.parse_args()
+
+    random.seed(0)
+    print("OrderCreate validation per order")
+    for items in args.items:
+        report(items, args.repeat or max(5, 100_000 // items))
+
+
+if __name__ == "__main__":
+    main()
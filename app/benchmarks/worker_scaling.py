@@ -0,0 +1,96 @@
+#worker_scaling.py measures throughput/latency of serve.py at different worker counts.
+#
+#   cd app && python -m benchmarks.worker_scaling --path /orders --workers 1 2 4 8
+#
+# Needs a configured database (.env) since the app creates its tables on start,
+# and redis_url for more than one worker (serve.py refuses to start without it).
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+async def wait_until_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not come up")
+
+
+async def load(url: str, concurrency: int, duration: float):
+    latencies, errors = [], 0
+    stop_at = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def user():
+            nonlocal errors
+            while time.monotonic() < stop_at:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    if response.status_code >= 500:
+                        errors += 1
+                except httpx.TransportError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(workers: int, args):
+    port = args.port
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        asyncio.run(wait_until_ready(base + "/"))
+        latencies, errors = asyncio.run(load(base + args.path, args.concurrency, args.duration))
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "workers": workers,
+        "rps": len(latencies) / args.duration,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default="/orders")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for workers in args.workers:
+        r = run(workers, args)
+        print(f"{r['workers']:>7} {r['rps']:>9.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#catalog.py keeps an immutable in-memory snapshot of what can be sold and at what
+#price, so create_order validates items and prices without a query per item.
+#
+# The snapshot is rebuilt only when catalog_version changes. Any flush that adds
+# or removes a product, variant or service, or changes a selling/print price,
+# bumps that row in the same transaction. Stock changes don't, so checkout
+# traffic never invalidates it. Each worker checks the version at most every
+# catalog_refresh_seconds. On a miss or a price mismatch it re-checks right
+# away before rejecting, so a product created on another worker is never
+# refused because of a stale snapshot. Stock is per store, so each store has
+# its own snapshot holding only its variants.
+import os
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import FrozenSet, List, Mapping, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+import stores
+from models import CatalogVersion, Product, Service, Variant
+
+load_dotenv()
+
+REFRESH_SECONDS = float(os.getenv("catalog_refresh_seconds", "2"))
+# Float prices: anything closer than this counts as equal
+PRICE_TOLERANCE = 0.005
+
+_PRICE_COLUMNS = {Variant: "selling_price", Service: "print_price"}
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    products: FrozenSet[int]
+    variants: Mapping[int, Tuple[int, float]]  # variant_id -> (product_id, selling_price)
+    services: Mapping[int, float]  # service_id -> print_price
+
+    def check_item(self, item: dict) -> Optional[str]:
+        """Why an order item can't be sold as requested, or None if it can."""
+        if item.get('product_id'):
+            if item['product_id'] not in self.products:
+                return f"Product {item['product_id']} not found"
+            if not item.get('variant_id'):
+                # Products are priced and stocked per variant
+                return f"Product {item['product_id']} item requires variant_id"
+            variant = self.variants.get(item['variant_id'])
+            if not variant or variant[0] != item['product_id']:
+                return f"Variant {item['variant_id']} not found"
+            if item['price'] < variant[1] - PRICE_TOLERANCE:
+                return f"Price {item['price']:.2f} for variant {item['variant_id']} is below the catalog price {variant[1]:.2f}"
+        elif item.get('service_id'):
+            price = self.services.get(item['service_id'])
+            if price is None:
+                return f"Service {item['service_id']} not found"
+            if item['price'] < price - PRICE_TOLERANCE:
+                return f"Price {item['price']:.2f} for service {item['service_id']} is below the catalog price {price:.2f}"
+        return None
+
+    def check_items(self, items: List[dict]) -> List[str]:
+        return [problem for problem in map(self.check_item, items) if problem]
+
+
+_EMPTY = CatalogSnapshot(-1, frozenset(), MappingProxyType({}), MappingProxyType({}))
+
+# store_id (None for an all-stores session) -> (snapshot, last version check)
+_snapshots = {}
+_lock = threading.Lock()
+
+
+def _read_version(db: Session) -> int:
+    return db.execute(select(CatalogVersion.version).where(CatalogVersion.id == 1)).scalar() or 0
+
+
+def load_snapshot(db: Session, version: int) -> CatalogSnapshot:
+    variants = db.execute(select(Variant.variant_id, Variant.product_id, Variant.selling_price)).all()
+    services = db.execute(select(Service.service_id, Service.print_price)).all()
+    return CatalogSnapshot(
+        version=version,
+        products=frozenset(db.execute(select(Product.product_id)).scalars()),
+        variants=MappingProxyType({v.variant_id: (v.product_id, v.selling_price) for v in variants}),
+        services=MappingProxyType({s.service_id: s.print_price for s in services}),
+    )
+
+
+def get_snapshot(db: Session, force: bool = False) -> CatalogSnapshot:
+    """Current snapshot for the session's store; checks catalog_version if the
+    last check is older than REFRESH_SECONDS (or force) and reloads when it moved."""
+    store_id = stores.session_store(db)
+    snapshot, checked_at = _snapshots.get(store_id, (_EMPTY, 0.0))
+    if not force and time.monotonic() - checked_at < REFRESH_SECONDS:
+        return snapshot
+    with _lock:
+        # Another thread may have refreshed while we waited for the lock
+        snapshot, checked_at = _snapshots.get(store_id, (_EMPTY, 0.0))
+        if not force and time.monotonic() - checked_at < REFRESH_SECONDS:
+            return snapshot
+        version = _read_version(db)
+        if version != snapshot.version:
+            snapshot = load_snapshot(db, version)
+        _snapshots[store_id] = (snapshot, time.monotonic())
+        return snapshot
+
+
+def check_items(db: Session, items: List[dict]) -> List[str]:
+    problems = get_snapshot(db).check_items(items)
+    if problems:
+        problems = get_snapshot(db, force=True).check_items(items)
+    return problems
+
+
+def _catalog_changed(session: Session) -> bool:
+    for obj in session.deleted:
+        if type(obj) in (Product, Variant, Service):
+            return True
+    for obj in session.new:
+        if type(obj) in (Product, Variant, Service):
+            return True
+    for obj in session.dirty:
+        column = _PRICE_COLUMNS.get(type(obj))
+        if column and inspect(obj).attrs[column].history.has_changes():
+            return True
+        if isinstance(obj, Variant) and inspect(obj).attrs.product_id.history.has_changes():
+            return True
+    return False
+
+
+@event.listens_for(Session, "after_flush")
+def bump_version(session: Session, flush_context):
+    if not _catalog_changed(session):
+        return
+    stmt = insert(CatalogVersion.__table__).values(id=1, version=1)
+    session.connection().execute(
+        stmt.on_conflict_do_update(
+            index_elements=["id"], set_={"version": CatalogVersion.__table__.c.version + 1}
+        )
+    )
+    # This worker sees its own change on the next order without waiting
+    session.info["catalog_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _expire_local(session: Session):
+    if session.info.pop("catalog_changed", False):
+        with _lock:
+            for store_id, (snapshot, _) in list(_snapshots.items()):
+                _snapshots[store_id] = (snapshot, 0.0)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget(session: Session):
+    session.info.pop("catalog_changed", None)
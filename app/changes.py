@@ -0,0 +1,63 @@
+#changes.py appends a change_log row for every synced entity a flush touches, in
+#the same transaction, so /sync can serve deltas instead of full tables.
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from models import ChangeLog, Order, OrderItem, OrderPayment, Product, Service, Variant
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+ENTITY_NAMES = {
+    Product: "product",
+    Variant: "variant",
+    Service: "service",
+    Order: "order",
+    OrderPayment: "order_payment",
+}
+
+_PRIMARY_KEYS = {
+    Product: "product_id",
+    Variant: "variant_id",
+    Service: "service_id",
+    Order: "order_id",
+    OrderPayment: "payment_id",
+}
+
+
+def _key(obj):
+    # Shared catalog rows (products, services) have no store
+    store_id = getattr(obj, "store_id", None)
+    if isinstance(obj, OrderItem):
+        # An order's items travel with the order
+        return ("order", obj.order_id, store_id)
+    return (ENTITY_NAMES[type(obj)], getattr(obj, _PRIMARY_KEYS[type(obj)]), store_id)
+
+
+def _changes(session: Session):
+    changes = {}
+    for obj in session.deleted:
+        if isinstance(obj, OrderItem):
+            changes.setdefault(_key(obj), UPSERT)
+        elif type(obj) in ENTITY_NAMES:
+            changes[_key(obj)] = DELETE
+
+    touched = list(session.new) + [o for o in session.dirty if session.is_modified(o, include_collections=False)]
+    for obj in touched:
+        if isinstance(obj, OrderItem) or type(obj) in ENTITY_NAMES:
+            changes.setdefault(_key(obj), UPSERT)
+    return changes
+
+
+@event.listens_for(Session, "after_flush")
+def record_changes(session: Session, flush_context):
+    changes = _changes(session)
+    if not changes:
+        return
+    session.connection().execute(
+        insert(ChangeLog.__table__),
+        [
+            {"entity": entity, "entity_id": entity_id, "store_id": store_id, "op": op}
+            for (entity, entity_id, store_id), op in changes.items()
+        ],
+    )
@@ -0,0 +1,158 @@
+#forecast_crud.py estimates daily demand per variant and how much to reorder.
+#
+# Sales history for every variant is loaded with one grouped query into a
+# (variants x days) NumPy matrix, and all statistics are computed on whole
+# arrays at once. Results are cached per store until one of its orders or
+# variants changes (change_log) or the day rolls over.
+import math
+import os
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import Session
+
+import stores
+from models import ChangeLog, Order, OrderArchive, OrderItem, OrderItemArchive, Product, Variant
+
+load_dotenv()
+
+WINDOW_DAYS = int(os.getenv("forecast_window_days", "90"))
+LEAD_TIME_DAYS = float(os.getenv("forecast_lead_time_days", "7"))
+# Days of demand each reorder should cover on top of the lead time
+REVIEW_DAYS = float(os.getenv("forecast_review_days", "14"))
+# Safety stock in standard deviations of daily demand (1.65 ~ 95% service level)
+SERVICE_Z = float(os.getenv("forecast_service_z", "1.65"))
+# Exponential smoothing weight of the most recent day
+EWMA_ALPHA = float(os.getenv("forecast_ewma_alpha", "0.1"))
+
+# store_id -> (key, rows)
+_cache = {}
+_lock = threading.Lock()
+
+
+def _sales_version(db: Session):
+    query = select(func.max(ChangeLog.seq)).where(ChangeLog.entity.in_(("order", "variant")))
+    store_id = stores.session_store(db)
+    if store_id is not None:
+        query = query.where(ChangeLog.store_id == store_id)
+    return db.execute(query).scalar()
+
+
+def load_daily_sales(db: Session, start: date):
+    """(variant_id, day, units) for every variant sold since start, hot and archived."""
+    since = datetime.combine(start, time.min)
+    parts = [
+        select(items.variant_id, orders.order_date, items.quantity)
+        .join(orders, orders.order_id == items.order_id)
+        .where(items.variant_id.isnot(None), orders.order_date >= since)
+        for items, orders in ((OrderItem, Order), (OrderItemArchive, OrderArchive))
+    ]
+    sales = union_all(*parts).subquery()
+    day = func.date(sales.c.order_date)
+    return db.execute(
+        select(sales.c.variant_id, day, func.sum(sales.c.quantity))
+        .group_by(sales.c.variant_id, day)
+    ).all()
+
+
+def compute(variant_ids: np.ndarray, stock: np.ndarray, sales: np.ndarray) -> dict:
+    """Demand statistics for every variant at once.
+
+    sales is (variants x days), oldest day first, today last.
+    """
+    days = sales.shape[1]
+    ma_7 = sales[:, -7:].mean(axis=1)
+    ma_28 = sales[:, -28:].mean(axis=1)
+    std_28 = sales[:, -28:].std(axis=1)
+
+    weights = EWMA_ALPHA * (1 - EWMA_ALPHA) ** np.arange(days)[::-1]
+    demand = sales @ (weights / weights.sum())
+
+    sold = sales.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sell_through = np.where(sold + stock > 0, sold / (sold + stock), 0.0)
+        days_left = np.where(demand > 0, stock / demand, np.inf)
+
+    safety = SERVICE_Z * std_28 * math.sqrt(LEAD_TIME_DAYS)
+    reorder_point = demand * LEAD_TIME_DAYS + safety
+    target = demand * (LEAD_TIME_DAYS + REVIEW_DAYS) + safety
+    reorder_qty = np.where(stock <= reorder_point, np.ceil(np.maximum(target - stock, 0)), 0)
+
+    return {
+        "variant_id": variant_ids,
+        "units_sold": sold,
+        "ma_7": ma_7,
+        "ma_28": ma_28,
+        "daily_demand": demand,
+        "sell_through": sell_through,
+        "days_of_stock": days_left,
+        "reorder_point": reorder_point,
+        "reorder_qty": reorder_qty.astype(int),
+    }
+
+
+def build_forecast(db: Session, today: Optional[date] = None) -> List[dict]:
+    today = today or date.today()
+    start = today - timedelta(days=WINDOW_DAYS - 1)
+
+    variants = db.execute(
+        select(Variant.variant_id, Variant.product_id, Variant.size, Variant.quantity,
+               Product.name, Product.color)
+        .join(Product, Product.product_id == Variant.product_id)
+        .order_by(Variant.variant_id)
+    ).all()
+    if not variants:
+        return []
+    variant_ids = np.fromiter((v.variant_id for v in variants), dtype=np.int64, count=len(variants))
+    stock = np.fromiter((v.quantity for v in variants), dtype=np.float64, count=len(variants))
+
+    sales = np.zeros((len(variants), WINDOW_DAYS))
+    rows = load_daily_sales(db, start)
+    if rows:
+        ids, days, units = zip(*rows)
+        ids = np.asarray(ids, dtype=np.int64)
+        offsets = np.fromiter(((d - start).days for d in days), dtype=np.int64, count=len(days))
+        rows_idx = np.searchsorted(variant_ids, ids)
+        # Sales of variants deleted since then have no row to land in
+        known = (rows_idx < len(variant_ids)) & (variant_ids[np.minimum(rows_idx, len(variant_ids) - 1)] == ids)
+        known &= (offsets >= 0) & (offsets < WINDOW_DAYS)
+        np.add.at(sales, (rows_idx[known], offsets[known]), np.asarray(units, dtype=np.float64)[known])
+
+    stats = compute(variant_ids, stock, sales)
+    result = []
+    for i, v in enumerate(variants):
+        days_left = stats["days_of_stock"][i]
+        result.append({
+            "variant_id": v.variant_id,
+            "product_id": v.product_id,
+            "name": v.name,
+            "color": v.color,
+            "size": v.size,
+            "stock": v.quantity,
+            "units_sold": int(stats["units_sold"][i]),
+            "ma_7": round(float(stats["ma_7"][i]), 3),
+            "ma_28": round(float(stats["ma_28"][i]), 3),
+            "daily_demand": round(float(stats["daily_demand"][i]), 3),
+            "sell_through": round(float(stats["sell_through"][i]), 4),
+            "days_of_stock": None if math.isinf(days_left) else round(float(days_left), 1),
+            "reorder_point": round(float(stats["reorder_point"][i]), 1),
+            "reorder_qty": int(stats["reorder_qty"][i]),
+        })
+    return result
+
+
+def get_forecast(db: Session, only_reorder: bool = False) -> List[dict]:
+    store_id = stores.session_store(db)
+    key = (date.today(), _sales_version(db))
+    with _lock:
+        cached_key, rows = _cache.get(store_id, (None, None))
+        if cached_key != key:
+            rows = build_forecast(db)
+            _cache[store_id] = (key, rows)
+    if only_reorder:
+        rows = [r for r in rows if r["reorder_qty"] > 0]
+    return sorted(rows, key=lambda r: (r["days_of_stock"] is None, r["days_of_stock"] or 0))
@@ -1,57 +1,92 @@
 from typing import List, Optional
 from unittest import result
-from sqlalchemy import func
+from sqlalchemy import Integer, any_, bindparam, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Session, joinedload
 from datetime import datetime
 from fastapi import HTTPException
 import models
 from models import OrderItem, Order, OrderPayment, SalesRecord, CashoutTransaction
-from schemas import OrderResponse, OrderPaymentCreate, SalesRecordCreate, CashoutTransactionCreate
+from models import OrderArchive
+from schemas import OrderResponseList, OrderPaymentCreate, SalesRecordCreate, CashoutTransactionCreate
+import crud.summary_crud as summary_crud
+import crud.reconciliation_crud as reconciliation_crud
+import crud.counter_crud as counter_crud
+import catalog
+import stock_ledger
+
+# -----------------------
+# Hot-path statements
+# -----------------------
+# Built once at import instead of on every call: SQLAlchemy serves their
+# compiled SQL from its cache, and the SQL text never changes, so drivers
+# that prepare statements (db_driver=psycopg) reuse the server-side plan.
+
+# Every variant of an order, locked in id order (one SQL text whatever the
+# number of variants)
+LOCK_VARIANTS = (
+    select(models.Variant)
+    .where(models.Variant.variant_id == any_(bindparam("variant_ids", type_=ARRAY(Integer))))
+    .order_by(models.Variant.variant_id)
+    .with_for_update()
+)
+
+PAID_SO_FAR = select(func.coalesce(func.sum(OrderPayment.amount), 0.0)).where(
+    OrderPayment.order_id == bindparam("order_id")
+)
+
+ORDERS_WITH_ITEMS = select(Order).options(joinedload(Order.items), joinedload(Order.payments))
+ARCHIVED_ORDERS_WITH_ITEMS = select(OrderArchive).options(
+    joinedload(OrderArchive.items), joinedload(OrderArchive.payments)
+)
+
+ORDER_PAYMENTS_PAGE = select(OrderPayment).offset(bindparam("skip")).limit(bindparam("limit"))
+
 
 def create_order(db: Session, order_data: dict):
     try:
+        # Existence and minimum prices come from the in-memory catalog snapshot
+        problems = catalog.check_items(db, order_data['items'])
+        if problems:
+            raise ValueError("; ".join(problems))
+
+        # Stock: lock every variant in the order with one query (in id order,
+        # so concurrent checkouts can't deadlock) and decrement in place
+        wanted = {}
+        for item in order_data['items']:
+            if item.get('variant_id'):
+                wanted[item['variant_id']] = wanted.get(item['variant_id'], 0) + item['quantity']
+        if wanted:
+            variants = db.scalars(LOCK_VARIANTS, {"variant_ids": list(wanted)}).all()
+            if len(variants) != len(wanted):
+                missing = set(wanted) - {v.variant_id for v in variants}
+                raise ValueError(f"Variant {min(missing)} not found")
+            for variant in variants:
+                if variant.quantity < wanted[variant.variant_id]:
+                    raise ValueError("Not enough stock")
+                variant.quantity -= wanted[variant.variant_id]
+
         # Create order
         db_order = models.Order(
             order_date=datetime.now(),
             total_price=order_data['total_price']
         )
         db.add(db_order)
+        stock_ledger.reason(db, stock_ledger.SALE, db_order)
         db.flush()  # Get order_id
         
-        # Process items
+        # Create items
         items = []
         for item in order_data['items']:
-            # Validate product/variant
-            if item.get('product_id'):
-                product = db.query(models.Product).get(item['product_id'])
-                if not product:
-                    raise ValueError(f"Product {item['product_id']} not found")
-                
-                if item.get('variant_id'):
-                    variant = db.query(models.Variant).filter_by(
-                        variant_id=item['variant_id'],
-                        product_id=item['product_id']
-                    ).first()
-                    if not variant:
-                        raise ValueError(f"Variant {item['variant_id']} not found")
-                    if variant.quantity < item['quantity']:
-                        raise ValueError("Not enough stock")
-                    variant.quantity -= item['quantity']
-            
-            # Validate service
-            elif item.get('service_id'):
-                service = db.query(models.Service).get(item['service_id'])
-                if not service:
-                    raise ValueError(f"Service {item['service_id']} not found")
-            
-            # Create item
             db_item = models.OrderItem(
                 order_id=db_order.order_id,
                 **{k: v for k, v in item.items() if v is not None}
             )
             db.add(db_item)
             items.append(db_item)
-        
+
+        summary_crud.add_order_summary(db, db_order, items)
+        counter_crud.increment(db, counter_crud.ITEMS_SOLD, len(items))
         db.commit()
         
         # Return properly structured data
@@ -73,15 +108,10 @@ def create_order(db: Session, order_data: dict):
     except Exception as e:
         db.rollback()
         raise
-def get_orders(db: Session):
-    orders = (
-        db.query(Order)
-        .options(
-            joinedload(Order.items),
-            joinedload(Order.payments)
-        )
-        .all()
-    )
+def get_orders(db: Session, include_archived: bool = False):
+    orders = db.scalars(ORDERS_WITH_ITEMS).unique().all()
+    if include_archived:
+        orders += db.scalars(ARCHIVED_ORDERS_WITH_ITEMS).unique().all()
 
     result = []
     for order in orders:
@@ -118,13 +148,16 @@ def get_orders(db: Session):
             }
             order_data["payments"].append(payment_data)
 
-        result.append(OrderResponse.parse_obj(order_data))
+        result.append(order_data)
 
-    return result  
+    return OrderResponseList.validate_python(result)
 
-#Count products
-def count_orders(db: Session):
-    return db.query(OrderItem).count()
+#Count products (order items sold), from the running counters
+def count_orders(db: Session, include_archived: bool = False):
+    names = [counter_crud.ITEMS_SOLD]
+    if include_archived:
+        names.append(counter_crud.ITEMS_SOLD_ARCHIVED)
+    return int(counter_crud.get_total(db, names))
 
 
 
@@ -141,16 +174,12 @@ def create_order_payment(db: Session, payment: OrderPaymentCreate) -> OrderPayme
     - 'complete' (when payment >= total)
     """
     # 1. Check if order exists
-    order = db.query(Order).get(payment.order_id)
+    order = db.get(Order, payment.order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
     # 2. Calculate current payment totals
-    existing_payments = db.query(OrderPayment).filter(
-        OrderPayment.order_id == payment.order_id
-    ).all()
-    
-    paid_amount = sum(p.amount for p in existing_payments)
+    paid_amount = db.scalar(PAID_SO_FAR, {"order_id": payment.order_id})
     new_total_paid = paid_amount + payment.amount
 
     # 3. Validate payment doesn't exceed order total
@@ -190,17 +219,22 @@ def create_order_payment(db: Session, payment: OrderPaymentCreate) -> OrderPayme
     if hasattr(Order, 'payment_id'):
         order.payment_id = db_payment.payment_id
 
+    # 7. Keep the order summary read model and the day's cash bucket in step
+    summary_crud.apply_order_payment(db, order, new_total_paid, db_payment.payment_date)
+    reconciliation_crud.add_payment(db, db_payment.payment_date, db_payment.amount)
+    counter_crud.increment(db, counter_crud.PAYMENTS_TOTAL, db_payment.amount)
+
     db.commit()
     db.refresh(db_payment)
     return db_payment
 
 # Small helper function (could add to your CRUD file)
 def update_order_payment_status(db: Session, order_id: int):
-    order = db.query(Order).get(order_id)
+    order = db.get(Order, order_id)
     if not order:
         return
     
-    total_paid = sum(p.amount for p in order.payments)
+    total_paid = db.scalar(PAID_SO_FAR, {"order_id": order_id})
     
     if total_paid >= order.total_price:
         order.payment_status = "paid"
@@ -208,12 +242,14 @@ def update_order_payment_status(db: Session, order_id: int):
         order.payment_status = "partial"
     else:
         order.payment_status = "pending"
-    
+
+    db.flush()
+    summary_crud.refresh_order_summary(db, order_id)
     db.commit()
 
 
 def get_order_payments(db: Session, skip: int = 0, limit: int = 100) -> List[OrderPayment]:
-    return db.query(OrderPayment).offset(skip).limit(limit).all()
+    return db.scalars(ORDER_PAYMENTS_PAGE, {"skip": skip, "limit": limit}).all()
 
 
 # -----------------------
@@ -232,13 +268,25 @@ def create_sales_record(db: Session, record: SalesRecordCreate) -> SalesRecord:
         cashout_transaction_id=record.cashout_transaction_id,
     )
     db.add(db_record)
+    reconciliation_crud.add_sales_record(db, db_record)
     db.commit()
     db.refresh(db_record)
     return db_record
 
 
-def get_sales_records(db: Session, skip: int = 0, limit: int = 100) -> List[SalesRecord]:
-    return db.query(SalesRecord).order_by(SalesRecord.date.desc()).offset(skip).limit(limit).all()
+def get_sales_records(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> List[SalesRecord]:
+    query = db.query(SalesRecord)
+    if start:
+        query = query.filter(SalesRecord.date >= start)
+    if end:
+        query = query.filter(SalesRecord.date < end)
+    return query.order_by(SalesRecord.date.desc()).offset(skip).limit(limit).all()
 
 
 def get_sales_record_by_date(db: Session, target_date: datetime) -> Optional[SalesRecord]:
@@ -256,27 +304,59 @@ def create_cashout_transaction(db: Session, cashout: CashoutTransactionCreate) -
         reason=cashout.reason
     )
     db.add(db_cashout)
+    reconciliation_crud.add_cashout(db, db_cashout.cashout_date, db_cashout.amount)
     db.commit()
     db.refresh(db_cashout)
     return db_cashout
 
 
-def get_cashout_transactions(db: Session, skip: int = 0, limit: int = 100) -> List[CashoutTransaction]:
-    return db.query(CashoutTransaction).order_by(CashoutTransaction.cashout_date.desc()).offset(skip).limit(limit).all()
-
-def get_total_payments_made(db: Session) -> float:
-    total = db.query(OrderPayment).with_entities(func.sum(OrderPayment.amount)).scalar()
-    return total if total else 0.0
+def get_cashout_transactions(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> List[CashoutTransaction]:
+    query = db.query(CashoutTransaction)
+    if start:
+        query = query.filter(CashoutTransaction.cashout_date >= start)
+    if end:
+        query = query.filter(CashoutTransaction.cashout_date < end)
+    return query.order_by(CashoutTransaction.cashout_date.desc()).offset(skip).limit(limit).all()
+
+def get_total_payments_made(db: Session, include_archived: bool = False) -> float:
+    names = [counter_crud.PAYMENTS_TOTAL]
+    if include_archived:
+        names.append(counter_crud.PAYMENTS_TOTAL_ARCHIVED)
+    return counter_crud.get_total(db, names)
 
 #For getting total payments made for a service or product
 def get_total_payments_for_item(db: Session, item_id: int, item_type: str) -> float:
     if item_type == 'product':
-        payments = db.query(OrderPayment).join(OrderItem).filter(OrderItem.product_id == item_id).all()
+        payments = db.query(OrderPayment).join(OrderItem, OrderItem.order_id == OrderPayment.order_id).filter(OrderItem.product_id == item_id).all()
     elif item_type == 'service':
-        payments = db.query(OrderPayment).join(OrderItem).filter(OrderItem.service_id == item_id).all()
+        payments = db.query(OrderPayment).join(OrderItem, OrderItem.order_id == OrderPayment.order_id).filter(OrderItem.service_id == item_id).all()
     else:
         raise ValueError("Invalid item type. Use 'product' or 'service'.")
 
     total = sum(payment.amount for payment in payments)
     return total if total else 0.0
 
+#Total payments per service in one grouped query (same totals as calling
+#get_total_payments_for_item for every service)
+def get_total_payments_per_service(db: Session) -> List[dict]:
+    rows = (
+        db.query(
+            models.Service.service_id,
+            models.Service.name,
+            func.coalesce(func.sum(OrderPayment.amount), 0.0)
+        )
+        .outerjoin(OrderItem, OrderItem.service_id == models.Service.service_id)
+        .outerjoin(OrderPayment, OrderPayment.order_id == OrderItem.order_id)
+        .group_by(models.Service.service_id, models.Service.name)
+        .all()
+    )
+    return [
+        {"service_id": service_id, "name": name, "total_payments": total}
+        for service_id, name, total in rows
+    ]
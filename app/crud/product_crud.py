@@ -4,7 +4,11 @@ from models import Product , Variant
 from schemas import ProductCreate
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import or_
+from sqlalchemy import or_, select
+import stock_ledger
+
+# Built once; SQLAlchemy serves the compiled SQL from its cache
+PRODUCTS_WITH_VARIANTS = select(Product).options(joinedload(Product.variants))
 
 #Create
 def create_product(db: Session, product: ProductCreate):
@@ -35,7 +39,7 @@ def create_product(db: Session, product: ProductCreate):
 
 #Read
 def get_products(db: Session):
-    return db.query(Product).options(joinedload(Product.variants)).all()
+    return db.scalars(PRODUCTS_WITH_VARIANTS).unique().all()
 
 #returns product by color seach or name search
 def search_products(db: Session, search: Optional[str] = None):
@@ -100,23 +104,27 @@ def create_variant(db: Session, product_id: int, variant):
         return None
 
     db_variant = Variant(
+        product_id=product_id,
         size=variant.size,
         quantity=variant.quantity,
         selling_price=variant.selling_price,
         item_cost=variant.item_cost,
         updated_at=datetime.now(),
-        image_url=variant.image_url,
     )
+    db.add(db_variant)
 
     db.commit()
     db.refresh(db_variant)
     return db_variant
 
-#Updating Variant
-def update_variant(db: Session, variant_id: int, variant):
-    db_variant = db.query(Product.variants).filter(Product.variants.variant_id == variant_id).first()
+#Updating Variant (a quantity change is recorded in the stock ledger as
+#`reason`, or as a restock/adjustment by direction)
+def update_variant(db: Session, variant_id: int, variant, reason: Optional[str] = None):
+    db_variant = db.query(Variant).filter(Variant.variant_id == variant_id).with_for_update().first()
     if not db_variant:
         return None
+    if reason:
+        stock_ledger.reason(db, reason)
 
     db_variant.size = variant.size
     db_variant.quantity = variant.quantity
@@ -130,7 +138,7 @@ def update_variant(db: Session, variant_id: int, variant):
 
 #Delete Variant
 def delete_variant(db: Session, variant_id: int):
-    db_variant = db.query(Product.variants).filter(Product.variants.variant_id == variant_id).first()
+    db_variant = db.query(Variant).filter(Variant.variant_id == variant_id).first()
     if not db_variant:
         return None
 
@@ -0,0 +1,141 @@
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import case, func, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from models import DailyCashBucket, OrderPayment, OrderPaymentArchive, CashoutTransaction, SalesRecord
+import stores
+
+# -----------------------
+# Bucket maintenance
+# -----------------------
+# Each write is an atomic INSERT ... ON CONFLICT DO UPDATE on the store's row
+# for the day, run inside the caller's transaction. The store is the
+# session's unless given.
+
+def _bump(db: Session, day: date, store_id: Optional[int] = None, **increments):
+    stmt = insert(DailyCashBucket).values(
+        store_id=stores.write_store(db) if store_id is None else store_id,
+        day=day, updated_at=datetime.now(), **increments
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[DailyCashBucket.store_id, DailyCashBucket.day],
+        set_={
+            **{k: getattr(DailyCashBucket, k) + stmt.excluded[k] for k in increments},
+            "updated_at": stmt.excluded.updated_at,
+        },
+    ))
+
+
+def add_payment(db: Session, payment_date: datetime, amount: float):
+    _bump(db, payment_date.date(), payments_total=amount, payments_count=1)
+
+
+def add_cashout(db: Session, cashout_date: datetime, amount: float):
+    _bump(db, cashout_date.date(), cashouts_total=amount, cashouts_count=1)
+
+
+def add_sales_record(db: Session, record: SalesRecord):
+    """Opening cash comes from the day's earliest record, closing cash from the
+    latest, by record date rather than by when they were entered. The
+    comparison runs against the locked bucket row, so concurrent records
+    can't overwrite a later one."""
+    stmt = insert(DailyCashBucket).values(
+        store_id=stores.write_store(db) if record.store_id is None else record.store_id,
+        day=record.date.date(),
+        opening_cash=record.opening_cash,
+        opening_at=record.date,
+        closing_cash=record.closing_cash,
+        closing_at=record.date,
+        updated_at=datetime.now(),
+    )
+    excluded = stmt.excluded
+    earlier = or_(DailyCashBucket.opening_at.is_(None), excluded.opening_at < DailyCashBucket.opening_at)
+    # Same date: the record entered last wins, as in rebuild_cash_buckets
+    later = or_(DailyCashBucket.closing_at.is_(None), excluded.closing_at >= DailyCashBucket.closing_at)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[DailyCashBucket.store_id, DailyCashBucket.day],
+        set_={
+            "opening_cash": case((earlier, excluded.opening_cash), else_=DailyCashBucket.opening_cash),
+            "opening_at": case((earlier, excluded.opening_at), else_=DailyCashBucket.opening_at),
+            "closing_cash": case((later, excluded.closing_cash), else_=DailyCashBucket.closing_cash),
+            "closing_at": case((later, excluded.closing_at), else_=DailyCashBucket.closing_at),
+            "updated_at": excluded.updated_at,
+        },
+    ))
+
+
+def rebuild_cash_buckets(db: Session) -> int:
+    """Recompute every bucket from payments (hot and archived), cashouts and sales
+    records, for every store the session sees."""
+    db.query(DailyCashBucket).delete()
+
+    payments = select(
+        OrderPayment.store_id, func.date(OrderPayment.payment_date).label("day"), OrderPayment.amount
+    ).union_all(
+        select(OrderPaymentArchive.store_id, func.date(OrderPaymentArchive.payment_date), OrderPaymentArchive.amount)
+    ).subquery()
+    for store_id, day, total, count in db.execute(
+        select(payments.c.store_id, payments.c.day, func.sum(payments.c.amount), func.count())
+        .group_by(payments.c.store_id, payments.c.day)
+    ):
+        _bump(db, day, store_id, payments_total=total, payments_count=count)
+
+    cashout_day = func.date(CashoutTransaction.cashout_date)
+    for store_id, day, total, count in db.execute(
+        select(CashoutTransaction.store_id, cashout_day, func.sum(CashoutTransaction.amount), func.count())
+        .group_by(CashoutTransaction.store_id, cashout_day)
+    ):
+        _bump(db, day, store_id, cashouts_total=total, cashouts_count=count)
+
+    for record in db.query(SalesRecord).order_by(SalesRecord.date, SalesRecord.record_id):
+        add_sales_record(db, record)
+
+    db.commit()
+    return db.query(DailyCashBucket).count()
+
+
+# -----------------------
+# Reconciliation
+# -----------------------
+
+def get_reconciliation(db: Session, start: date, end: date) -> dict:
+    """Expected cash, cashouts and variance for each day in [start, end].
+
+    All payments are counted as cash (payments carry no method yet). Days
+    without activity are listed with zero totals.
+    """
+    buckets = {
+        b.day: b for b in
+        db.query(DailyCashBucket)
+        .filter(DailyCashBucket.day >= start, DailyCashBucket.day <= end)
+        .all()
+    }
+
+    days, variance_total = [], 0.0
+    totals = {"payments_total": 0.0, "payments_count": 0, "cashouts_total": 0.0, "cashouts_count": 0}
+    day = start
+    while day <= end:
+        b = buckets.get(day)
+        row = {
+            "day": day,
+            "opening_cash": b.opening_cash if b else None,
+            "payments_total": b.payments_total if b else 0.0,
+            "payments_count": b.payments_count if b else 0,
+            "cashouts_total": b.cashouts_total if b else 0.0,
+            "cashouts_count": b.cashouts_count if b else 0,
+            "closing_cash": b.closing_cash if b else None,
+            "expected_cash": None,
+            "variance": None,
+        }
+        if row["opening_cash"] is not None:
+            row["expected_cash"] = row["opening_cash"] + row["payments_total"] - row["cashouts_total"]
+            if row["closing_cash"] is not None:
+                row["variance"] = row["closing_cash"] - row["expected_cash"]
+                variance_total += row["variance"]
+        for key in totals:
+            totals[key] += row[key]
+        days.append(row)
+        day += timedelta(days=1)
+
+    return {"start": start, "end": end, **totals, "variance_total": variance_total, "days": days}
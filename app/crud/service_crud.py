@@ -1,13 +1,18 @@
+from sqlalchemy import bindparam, select
 from sqlalchemy.orm import Session
 from datetime import datetime
 from models import Service
 from schemas import ServiceCreate
 
+# Built once; SQLAlchemy serves the compiled SQL from its cache
+SERVICE_BY_ID = select(Service).where(Service.service_id == bindparam("service_id"))
+SERVICES_PAGE = select(Service).offset(bindparam("skip")).limit(bindparam("limit"))
+
 def get_service(db: Session, service_id: int):
-    return db.query(Service).filter(Service.service_id == service_id).first()
+    return db.scalars(SERVICE_BY_ID, {"service_id": service_id}).first()
 
 def get_services(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Service).offset(skip).limit(limit).all()
+    return db.scalars(SERVICES_PAGE, {"skip": skip, "limit": limit}).all()
 
 def create_service(db: Session, service: ServiceCreate):
     db_service = Service(
@@ -0,0 +1,114 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import BigInteger, DateTime, cast, func, insert, literal, select, text
+from sqlalchemy.orm import Session
+from models import StockMovement, StockSnapshot, Variant
+import stores
+
+# -----------------------
+# Snapshots
+# -----------------------
+
+def take_snapshot(db: Session) -> int:
+    """Record every variant's quantity (of the session's store, or of all
+    stores) as of now. Returns the number of variants recorded.
+
+    Ledger writers wait for the few statements this takes, so every movement
+    up to last_movement_id is committed and already counted in the quantities.
+    """
+    db.execute(text("LOCK TABLE stock_movements IN SHARE MODE"))
+    taken_at = db.execute(select(cast(func.clock_timestamp(), DateTime))).scalar()
+    last_movement_id = db.execute(select(func.coalesce(func.max(StockMovement.movement_id), 0))).scalar()
+
+    variants = select(
+        Variant.store_id, literal(taken_at, DateTime), Variant.variant_id, Variant.quantity,
+        literal(last_movement_id, BigInteger),
+    )
+    store_id = stores.session_store(db)
+    if store_id is not None:
+        variants = variants.where(Variant.store_id == store_id)
+    result = db.execute(
+        insert(StockSnapshot).from_select(
+            ["store_id", "taken_at", "variant_id", "quantity", "last_movement_id"], variants
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+# -----------------------
+# Point-in-time stock
+# -----------------------
+# Start from the newest snapshot taken at or before `at` and apply the
+# movements recorded since, up to `at`: at most one snapshot interval of the
+# ledger is read. Before the first snapshot, today's stock is rolled back by
+# the movements after `at` instead. Stock changes made before the ledger
+# existed are not known, so times earlier than that read as today's stock
+# minus everything since.
+
+def get_stock_at(db: Session, at: datetime) -> dict:
+    store_id = stores.write_store(db)
+    snapshot = db.execute(
+        select(StockSnapshot.taken_at, StockSnapshot.last_movement_id)
+        .where(StockSnapshot.store_id == store_id, StockSnapshot.taken_at <= at)
+        .order_by(StockSnapshot.taken_at.desc())
+        .limit(1)
+    ).first()
+
+    if snapshot is not None:
+        base = db.execute(
+            select(StockSnapshot.variant_id, StockSnapshot.quantity)
+            .where(StockSnapshot.store_id == store_id, StockSnapshot.taken_at == snapshot.taken_at)
+        ).all()
+        window = (
+            StockMovement.movement_id > snapshot.last_movement_id,
+            StockMovement.created_at <= at,
+        )
+        sign = 1
+    else:
+        base = db.execute(
+            select(Variant.variant_id, Variant.quantity).where(Variant.store_id == store_id)
+        ).all()
+        window = (StockMovement.created_at > at,)
+        sign = -1
+
+    deltas = db.execute(
+        select(StockMovement.variant_id, func.sum(StockMovement.delta), func.count())
+        .where(StockMovement.store_id == store_id, *window)
+        .group_by(StockMovement.variant_id)
+    ).all()
+
+    quantities = dict(base)
+    for variant_id, delta, _ in deltas:
+        quantities[variant_id] = quantities.get(variant_id, 0) + sign * delta
+    return {
+        "at": at,
+        "snapshot_at": snapshot.taken_at if snapshot is not None else None,
+        "movements": sum(count for _, _, count in deltas),
+        "items": [
+            {"variant_id": variant_id, "quantity": quantity}
+            for variant_id, quantity in sorted(quantities.items())
+        ],
+    }
+
+
+# -----------------------
+# Ledger
+# -----------------------
+
+def get_movements(
+    db: Session,
+    variant_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 100,
+) -> List[StockMovement]:
+    """Newest first"""
+    query = db.query(StockMovement)
+    if variant_id is not None:
+        query = query.filter(StockMovement.variant_id == variant_id)
+    if start is not None:
+        query = query.filter(StockMovement.created_at >= start)
+    if end is not None:
+        query = query.filter(StockMovement.created_at <= end)
+    return query.order_by(StockMovement.movement_id.desc()).limit(limit).all()
@@ -0,0 +1,144 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import func, select, update, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from models import Order, OrderItem, OrderPayment, OrderSummary
+import stores
+
+# -----------------------
+# Order summary maintenance
+# -----------------------
+# Callers run these inside their own transaction and commit themselves, so
+# the projection never disagrees with the order tables.
+
+def add_order_summary(db: Session, order: Order, items: List[OrderItem]):
+    """Summary row for a freshly created order (no payments yet)."""
+    total = float(order.total_price or 0.0)
+    db.execute(insert(OrderSummary).values(
+        order_id=order.order_id,
+        store_id=order.store_id,
+        order_date=order.order_date,
+        total_price=total,
+        item_count=len(items),
+        units=sum(i.quantity for i in items),
+        amount_paid=0.0,
+        balance=total,
+        status=order.payment_status or "pending",
+        updated_at=datetime.now(),
+    ))
+
+
+def apply_order_payment(db: Session, order: Order, amount_paid: float, payment_date: datetime):
+    """Record a new paid total; amount_paid is the order's total after the payment."""
+    result = db.execute(
+        update(OrderSummary)
+        .where(OrderSummary.order_id == order.order_id)
+        .values(
+            amount_paid=amount_paid,
+            balance=float(order.total_price or 0.0) - amount_paid,
+            status=order.payment_status,
+            last_payment_date=func.greatest(
+                func.coalesce(OrderSummary.last_payment_date, payment_date), payment_date
+            ),
+            updated_at=datetime.now(),
+        )
+    )
+    if result.rowcount == 0:
+        # Order predates the projection
+        refresh_order_summary(db, order.order_id)
+
+
+def _summary_select():
+    items = (
+        select(
+            OrderItem.order_id,
+            func.count().label("item_count"),
+            func.sum(OrderItem.quantity).label("units"),
+        )
+        .group_by(OrderItem.order_id)
+        .subquery()
+    )
+    payments = (
+        select(
+            OrderPayment.order_id,
+            func.sum(OrderPayment.amount).label("amount_paid"),
+            func.max(OrderPayment.payment_date).label("last_payment_date"),
+        )
+        .group_by(OrderPayment.order_id)
+        .subquery()
+    )
+    total = func.coalesce(Order.total_price, 0.0)
+    paid = func.coalesce(payments.c.amount_paid, 0.0)
+    return (
+        select(
+            Order.order_id,
+            Order.store_id,
+            Order.order_date,
+            total.label("total_price"),
+            func.coalesce(items.c.item_count, 0).label("item_count"),
+            func.coalesce(items.c.units, 0).label("units"),
+            paid.label("amount_paid"),
+            (total - paid).label("balance"),
+            Order.payment_status.label("status"),
+            payments.c.last_payment_date,
+            func.now().label("updated_at"),
+        )
+        .outerjoin(items, items.c.order_id == Order.order_id)
+        .outerjoin(payments, payments.c.order_id == Order.order_id)
+    )
+
+
+def _upsert_from(select_stmt):
+    columns = [
+        "order_id", "store_id", "order_date", "total_price", "item_count", "units",
+        "amount_paid", "balance", "status", "last_payment_date", "updated_at",
+    ]
+    stmt = insert(OrderSummary).from_select(columns, select_stmt)
+    return stmt.on_conflict_do_update(
+        index_elements=[OrderSummary.order_id],
+        set_={c: stmt.excluded[c] for c in columns if c != "order_id"},
+    )
+
+
+def refresh_order_summary(db: Session, order_id: int):
+    """Recompute one order's summary from the order tables."""
+    db.execute(_upsert_from(_summary_select().where(Order.order_id == order_id)))
+
+
+def rebuild_order_summaries(db: Session) -> int:
+    """Recompute every summary (of the session's store, or of all stores) and
+    drop rows whose order no longer exists."""
+    db.execute(delete(OrderSummary).where(
+        ~select(Order.order_id).where(Order.order_id == OrderSummary.order_id).exists()
+    ))
+    summaries = _summary_select()
+    store_id = stores.session_store(db)
+    if store_id is not None:
+        # INSERT ... SELECT doesn't get the session's store criteria
+        summaries = summaries.where(Order.store_id == store_id)
+    db.execute(_upsert_from(summaries))
+    db.commit()
+    return db.query(OrderSummary).count()
+
+
+# -----------------------
+# Reads
+# -----------------------
+
+def get_order_summaries(
+    db: Session,
+    status: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = 100,
+) -> List[OrderSummary]:
+    query = db.query(OrderSummary)
+    if status:
+        query = query.filter(OrderSummary.status == status)
+    if start:
+        query = query.filter(OrderSummary.order_date >= start)
+    if end:
+        query = query.filter(OrderSummary.order_date < end)
+    return query.order_by(OrderSummary.order_date.desc()).offset(skip).limit(limit).all()
@@ -0,0 +1,198 @@
+from typing import Dict, List, Tuple
+from sqlalchemy import BigInteger, cast, or_, select, text, tuple_, union_all
+from sqlalchemy.orm import Session, joinedload
+from models import ChangeLog, Product, Variant, Service, Order, OrderPayment
+import stores
+
+# Changes are paged in (txid, seq) order and only up to the oldest transaction
+# still running: a transaction that took its seq earlier but commits later
+# always sorts after the cursor, so it can't be skipped. Must read from the
+# primary; a replica's snapshot says nothing about the primary's transactions.
+OLDEST_RUNNING_TXID = cast(text("pg_snapshot_xmin(pg_current_snapshot())::text"), BigInteger)
+MAX_PAGE_SIZE = 5000
+
+# entity -> (response key, model, primary key column)
+ENTITIES = {
+    "product": ("products", Product, Product.product_id),
+    "variant": ("variants", Variant, Variant.variant_id),
+    "service": ("services", Service, Service.service_id),
+    "order": ("orders", Order, Order.order_id),
+    "order_payment": ("order_payments", OrderPayment, OrderPayment.payment_id),
+}
+
+
+def _product(p: Product) -> dict:
+    return {
+        "product_id": p.product_id,
+        "name": p.name,
+        "description": p.description,
+        "color": p.color,
+        "image_url": p.image_url,
+        "created_at": p.created_at,
+    }
+
+
+def _variant(v: Variant) -> dict:
+    return {
+        "variant_id": v.variant_id,
+        "product_id": v.product_id,
+        "size": v.size,
+        "quantity": v.quantity,
+        "selling_price": v.selling_price,
+        "item_cost": v.item_cost,
+        "updated_at": v.updated_at,
+    }
+
+
+def _service(s: Service) -> dict:
+    return {
+        "service_id": s.service_id,
+        "name": s.name,
+        "size": s.size,
+        "print_price": s.print_price,
+        "image_url": s.image_url,
+        "created_at": s.created_at,
+    }
+
+
+def _order(o: Order) -> dict:
+    return {
+        "order_id": o.order_id,
+        "order_date": o.order_date,
+        "total_price": o.total_price,
+        "payment_status": o.payment_status,
+        "items": [{
+            "order_item_id": i.order_item_id,
+            "order_id": i.order_id,
+            "product_id": i.product_id,
+            "service_id": i.service_id,
+            "variant_id": i.variant_id,
+            "quantity": i.quantity,
+            "price": i.price,
+        } for i in o.items],
+    }
+
+
+def _order_payment(p: OrderPayment) -> dict:
+    return {
+        "payment_id": p.payment_id,
+        "order_id": p.order_id,
+        "amount": p.amount,
+        "payment_date": p.payment_date,
+        "status": p.status,
+        "created_at": p.created_at,
+        "updated_at": p.updated_at,
+    }
+
+
+SERIALIZERS = {
+    "product": _product,
+    "variant": _variant,
+    "service": _service,
+    "order": _order,
+    "order_payment": _order_payment,
+}
+
+
+def _load(db: Session, entity: str, ids: List[int]):
+    _, model, pk = ENTITIES[entity]
+    query = db.query(model).filter(pk.in_(ids))
+    if model is Order:
+        query = query.options(joinedload(Order.items))
+    return {getattr(row, pk.key): row for row in query.all()}
+
+
+def _visible(store_id: int):
+    # A store sees its own rows plus the shared catalog
+    return or_(ChangeLog.store_id == store_id, ChangeLog.store_id.is_(None))
+
+
+def get_change_version(db: Session) -> Tuple[int, int]:
+    """Newest (txid, seq) visible to the session's store below the oldest
+    running transaction, the same watermark /sync pages up to.
+
+    max(seq) alone isn't commit-ordered: a transaction that took its seq
+    before a newer one but commits after it would leave the version where
+    it was. Every commit moves this watermark once the transactions before
+    it have finished.
+    """
+    def latest(*conditions):
+        return (
+            select(ChangeLog.txid, ChangeLog.seq)
+            .where(ChangeLog.txid < OLDEST_RUNNING_TXID, *conditions)
+            .order_by(ChangeLog.txid.desc(), ChangeLog.seq.desc())
+            .limit(1)
+        )
+
+    store_id = stores.session_store(db)
+    if store_id is None:
+        query = latest()
+    else:
+        # Two index lookups on (store_id, txid, seq) instead of an OR over the whole log
+        both = union_all(latest(ChangeLog.store_id == store_id), latest(ChangeLog.store_id.is_(None))).subquery()
+        query = select(both.c.txid, both.c.seq).order_by(both.c.txid.desc(), both.c.seq.desc()).limit(1)
+    row = db.execute(query).first()
+    return (row.txid, row.seq) if row else (0, 0)
+
+
+def parse_cursor(since: str) -> Tuple[int, int]:
+    """"<txid>:<seq>"; a bare seq (cursors from before txids) means (0, seq).
+    Raises ValueError for anything else."""
+    txid, _, seq = since.rpartition(":")
+    return int(txid or 0), int(seq)
+
+
+def get_changes(db: Session, since: Tuple[int, int] = (0, 0), limit: int = 500) -> dict:
+    """Everything that changed after cursor `since`, one page at a time.
+
+    Several changes to the same row inside a page collapse into one entry.
+    Rows are returned as they are now, and a row that is gone by the time
+    the page is read comes back as a tombstone.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(ChangeLog.txid, ChangeLog.seq, ChangeLog.entity, ChangeLog.entity_id, ChangeLog.op).filter(
+        tuple_(ChangeLog.txid, ChangeLog.seq) > tuple_(*since),
+        ChangeLog.txid < OLDEST_RUNNING_TXID,
+    )
+    store_id = stores.session_store(db)
+    if store_id is not None:
+        query = query.filter(_visible(store_id))
+    entries = (
+        query
+        .order_by(ChangeLog.txid, ChangeLog.seq)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest: Dict[tuple, str] = {}
+    for _, _, entity, entity_id, op in entries:
+        latest[(entity, entity_id)] = op
+
+    changes = {key: [] for key, _, _ in ENTITIES.values()}
+    deleted = {key: [] for key, _, _ in ENTITIES.values()}
+
+    wanted: Dict[str, List[int]] = {}
+    for (entity, entity_id), op in latest.items():
+        if op == "delete":
+            deleted[ENTITIES[entity][0]].append(entity_id)
+        else:
+            wanted.setdefault(entity, []).append(entity_id)
+
+    for entity, ids in wanted.items():
+        key = ENTITIES[entity][0]
+        rows = _load(db, entity, ids)
+        for entity_id in ids:
+            row = rows.get(entity_id)
+            if row is None:
+                deleted[key].append(entity_id)
+            else:
+                changes[key].append(SERIALIZERS[entity](row))
+
+    return {
+        "cursor": "{}:{}".format(*((entries[-1].txid, entries[-1].seq) if entries else since)),
+        "has_more": has_more,
+        "changes": changes,
+        "deleted": deleted,
+    }
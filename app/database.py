@@ -1,8 +1,10 @@
 #database.py will handle the connection to the PostgreSQL database using psycopg2 and environment variables.
 import psycopg2
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 from dotenv import load_dotenv
 import os
 
@@ -17,11 +19,144 @@ HOST = os.getenv("host")
 PORT = os.getenv("port")
 DBNAME = os.getenv("dbname")
 
+# Optional read replica (falls back to the primary credentials/db name)
+REPLICA_HOST = os.getenv("replica_host")
+REPLICA_PORT = os.getenv("replica_port", PORT)
+REPLICA_DBNAME = os.getenv("replica_dbname", DBNAME)
+REPLICA_MAX_LAG = float(os.getenv("replica_max_lag_seconds", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("replica_check_interval_seconds", "10"))
 
-DATABASE_URL = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DBNAME}"
 
-engine = create_engine(DATABASE_URL, echo=True)
+# Driver: psycopg2 (default) or psycopg (psycopg 3, pip install "psycopg[binary]").
+# With psycopg 3 a statement run db_prepare_threshold times on a connection is
+# prepared server-side, so Postgres skips parsing and planning it afterwards.
+# Set db_prepare_threshold=off behind a transaction-mode pgbouncer.
+DB_DRIVER = os.getenv("db_driver", "psycopg2")
+PREPARE_THRESHOLD = os.getenv("db_prepare_threshold", "5")
+SCHEME = "postgresql+psycopg" if DB_DRIVER == "psycopg" else "postgresql"
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DATABASE_URL = f"{SCHEME}://{USER}:{PASSWORD}@{HOST}:{PORT}/{DBNAME}"
 
-Base = declarative_base()
\ No newline at end of file
+# Per-process pool size. serve.py sets these per worker so that
+# workers * (pool_size + max_overflow) stays under Postgres max_connections.
+POOL_SIZE = int(os.getenv("db_pool_size", "5"))
+MAX_OVERFLOW = int(os.getenv("db_max_overflow", "10"))
+
+
+def make_engine(url: str, **kwargs):
+    """Engine with the process's pool size and driver settings."""
+    connect_args = {}
+    if url.startswith("postgresql://") and SCHEME != "postgresql":
+        url = SCHEME + url[len("postgresql"):]
+    if url.startswith("postgresql+psycopg://"):
+        connect_args["prepare_threshold"] = None if PREPARE_THRESHOLD == "off" else int(PREPARE_THRESHOLD)
+    return create_engine(
+        url, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, connect_args=connect_args, **kwargs
+    )
+
+
+# SQL logging goes through log_config (sql_echo=on), not echo=True
+engine = make_engine(DATABASE_URL)
+
+replica_engine = None
+if REPLICA_HOST:
+    REPLICA_URL = f"{SCHEME}://{USER}:{PASSWORD}@{REPLICA_HOST}:{REPLICA_PORT}/{REPLICA_DBNAME}"
+    replica_engine = make_engine(REPLICA_URL, pool_pre_ping=True)
+
+
+# Replay lag in seconds. A standby that has replayed everything it received
+# reports 0 even if the primary has been idle; a non-standby reports 0 too,
+# which lets two plain local instances stand in for primary/replica.
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReplicaMonitor:
+    """Caches replica health so routing never waits on a check.
+
+    At most one thread re-checks per interval; everyone else uses the last
+    known state. Unreachable or lagging replicas are reported unusable.
+    """
+
+    def __init__(self, replica, max_lag: float, interval: float):
+        self.replica = replica
+        self.max_lag = max_lag
+        self.interval = interval
+        self.healthy = replica is not None
+        self.lag = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def check(self) -> bool:
+        try:
+            with self.replica.connect().execution_options(query_audit_ignore=True) as conn:
+                self.lag = float(conn.execute(REPLICA_LAG_SQL).scalar() or 0)
+            self.healthy = self.lag <= self.max_lag
+        except Exception:
+            self.lag = None
+            self.healthy = False
+        self.checked_at = time.monotonic()
+        return self.healthy
+
+    def is_usable(self) -> bool:
+        if self.replica is None:
+            return False
+        if time.monotonic() - self.checked_at >= self.interval and self._lock.acquire(blocking=False):
+            try:
+                self.check()
+            finally:
+                self._lock.release()
+        return self.healthy
+
+    def status(self) -> dict:
+        return {
+            "configured": self.replica is not None,
+            "healthy": self.healthy if self.replica is not None else False,
+            "lag_seconds": self.lag,
+            "max_lag_seconds": self.max_lag,
+        }
+
+
+replica_monitor = ReplicaMonitor(replica_engine, REPLICA_MAX_LAG, REPLICA_CHECK_INTERVAL)
+
+
+class RoutingSession(Session):
+    """Sends reads to the replica while it is healthy.
+
+    Flushes always go to the primary, and once a session has written
+    anything every later statement stays on the primary so the caller
+    reads its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.bind is not None:
+            # Explicitly bound (e.g. to a connection in a test transaction)
+            return self.bind
+        if (
+            self.info.get("use_replica")
+            and not self.info.get("wrote")
+            and not self._flushing
+            and replica_monitor.is_usable()
+        ):
+            return replica_engine
+        return engine
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            self.info["wrote"] = True
+        super().flush(objects)
+
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+
+# Sessions for list/report endpoints. Without a replica this behaves exactly
+# like SessionLocal.
+ReadSessionLocal = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False, info={"use_replica": True}
+)
+
+Base = declarative_base()
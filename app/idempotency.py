@@ -0,0 +1,248 @@
+#idempotency.py dedupes retried POSTs that carry an Idempotency-Key header.
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import redis
+except ImportError:  # redis is optional, the in-process store is the default
+    redis = None
+
+load_dotenv()
+
+IDEMPOTENCY_TTL = int(os.getenv("idempotency_ttl_seconds", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("idempotency_max_keys", "100000"))
+# How long a duplicate waits for the first request before giving up with 409
+IDEMPOTENCY_WAIT = float(os.getenv("idempotency_wait_seconds", "30"))
+# Redis only: a pending key expires this long after its worker stops renewing
+# it (e.g. crashed); renewed every third of it while the request runs
+IDEMPOTENCY_LOCK_TTL = float(os.getenv("idempotency_lock_ttl_seconds", "10"))
+REDIS_URL = os.getenv("redis_url")
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+
+REPLAY = "replay"
+WAIT = "wait"
+RUN = "run"
+
+
+class MemoryIdempotencyStore:
+    """Per-process store. Fine for a single worker; use redis_url for more."""
+
+    def __init__(self, ttl: int = IDEMPOTENCY_TTL, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        # key -> (expires_at, fingerprint, status_code, body). The TTL is the
+        # same for every key, so insertion order is also expiry order.
+        self._done = OrderedDict()
+        # key -> (fingerprint, threading.Event)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        while self._done:
+            key, entry = next(iter(self._done.items()))
+            if entry[0] > now and len(self._done) <= self.max_keys:
+                break
+            self._done.popitem(last=False)
+
+    def begin(self, key: str, fingerprint: str):
+        with self._lock:
+            now = time.monotonic()
+            self._evict(now)
+            entry = self._done.get(key)
+            if entry is not None:
+                return REPLAY, entry[1:]
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                return WAIT, inflight
+            self._inflight[key] = (fingerprint, threading.Event())
+            return RUN, None
+
+    def wait(self, handle, timeout: float) -> bool:
+        return handle[1].wait(timeout)
+
+    def keep_alive(self, key: str, handle):
+        # In-flight keys don't expire here
+        return nullcontext()
+
+    def complete(self, key: str, handle, fingerprint: str, status_code: int, body):
+        with self._lock:
+            self._done[key] = (time.monotonic() + self.ttl, fingerprint, status_code, body)
+            _, event = self._inflight.pop(key)
+        event.set()
+
+    def abort(self, key: str, handle):
+        with self._lock:
+            inflight = self._inflight.pop(key, None)
+        if inflight is not None:
+            inflight[1].set()
+
+
+class RedisIdempotencyStore:
+    """Shared store so retries landing on another worker are deduped too."""
+
+    POLL_INTERVAL = 0.05
+    # Extend the pending entry only if it is still ours
+    RENEW = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+    # Store the result / drop the entry only if it is still ours; a worker
+    # whose entry expired must not clobber the one that took over the key
+    COMPLETE = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    end
+    return 0
+    """
+    ABORT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url: str, ttl: int = IDEMPOTENCY_TTL, lock_ttl: float = IDEMPOTENCY_LOCK_TTL):
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        # A crashed worker must not hold a key forever
+        self.lock_ttl_ms = int(lock_ttl * 1000)
+        self._renew = self.client.register_script(self.RENEW)
+        self._complete = self.client.register_script(self.COMPLETE)
+        self._abort = self.client.register_script(self.ABORT)
+
+    def _name(self, key: str) -> str:
+        return f"idempotency:{key}"
+
+    def begin(self, key: str, fingerprint: str):
+        name = self._name(key)
+        pending = json.dumps({"state": "pending", "fingerprint": fingerprint, "owner": uuid.uuid4().hex})
+        if self.client.set(name, pending, nx=True, px=self.lock_ttl_ms):
+            return RUN, pending
+        raw = self.client.get(name)
+        if raw is None:
+            # Expired or aborted between SET and GET, try again
+            return self.begin(key, fingerprint)
+        entry = json.loads(raw)
+        if entry["state"] == "done":
+            return REPLAY, (entry["fingerprint"], entry["status_code"], entry["body"])
+        return WAIT, name
+
+    def wait(self, handle, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            raw = self.client.get(handle)
+            if raw is None or json.loads(raw)["state"] == "done":
+                return True
+            time.sleep(self.POLL_INTERVAL)
+        return False
+
+    @contextmanager
+    def keep_alive(self, key: str, pending: str):
+        """Renew the pending entry while the block runs, however long it takes."""
+        name = self._name(key)
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.lock_ttl_ms / 3000):
+                try:
+                    if not self._renew(keys=[name], args=[pending, self.lock_ttl_ms]):
+                        return  # completed, aborted or lost
+                except redis.RedisError:
+                    pass  # try again next round; the entry outlives a few misses
+
+        thread = threading.Thread(target=renew, name="idempotency-renew", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+
+    def complete(self, key: str, pending: str, fingerprint: str, status_code: int, body):
+        entry = {"state": "done", "fingerprint": fingerprint, "status_code": status_code, "body": body}
+        self._complete(keys=[self._name(key)], args=[pending, json.dumps(entry), self.ttl])
+
+    def abort(self, key: str, pending: str):
+        self._abort(keys=[self._name(key)], args=[pending])
+
+
+def _make_store():
+    if REDIS_URL and redis is not None:
+        return RedisIdempotencyStore(REDIS_URL)
+    if REDIS_URL:
+        # serve.py refuses to start several workers like this; a single one is fine
+        logger.error("redis_url is set but the redis package is not installed; "
+                     "idempotency keys are kept in this process only")
+    return MemoryIdempotencyStore()
+
+
+store = _make_store()
+
+
+def fingerprint_payload(payload) -> str:
+    encoded = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def run_idempotent(scope: str, key: Optional[str], payload, fn: Callable) -> Tuple[object, bool]:
+    """Run fn once per (scope, key) and return (body, replayed).
+
+    Without a key fn just runs. A key seen before returns the stored body
+    without calling fn; a duplicate that arrives while the first request is
+    still running waits for it instead of running fn a second time. Only
+    successful results are stored, so a failed request can be retried with
+    the same key.
+    """
+    if not key:
+        return jsonable_encoder(fn()), False
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+
+    scoped_key = f"{scope}:{key}"
+    fingerprint = fingerprint_payload(payload)
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT
+
+    while True:
+        state, value = store.begin(scoped_key, fingerprint)
+        if state == REPLAY:
+            stored_fingerprint, _, body = value
+            if stored_fingerprint != fingerprint:
+                raise HTTPException(
+                    status_code=422,
+                    detail="Idempotency-Key was already used with a different request body"
+                )
+            return body, True
+        if state == RUN:
+            handle = value
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not store.wait(value, remaining):
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still being processed"
+            )
+
+    try:
+        with store.keep_alive(scoped_key, handle):
+            body = jsonable_encoder(fn())
+    except BaseException:
+        store.abort(scoped_key, handle)
+        raise
+    store.complete(scoped_key, handle, fingerprint, 200, body)
+    return body, False
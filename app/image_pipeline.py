@@ -0,0 +1,148 @@
+#image_pipeline.py turns an uploaded product photo into WebP renditions stored
+#under a content hash, so the POS grid downloads small thumbnails and
+#re-uploading the same picture (under any name) stores nothing new.
+#
+#   product_images/<sha256[:2]>/<sha256>/original.<ext>
+#   product_images/<sha256[:2]>/<sha256>/{thumb,medium,large}.webp
+import asyncio
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict
+
+from dotenv import load_dotenv
+
+from storage import get_storage
+
+load_dotenv()
+
+# name -> longest edge in pixels
+RENDITIONS = {"thumb": 256, "medium": 1024, "large": 2048}
+WEBP_QUALITY = 80
+MAX_UPLOAD_BYTES = int(os.getenv("image_max_upload_bytes", str(15 * 1024 * 1024)))
+# Refuse images that would decode to more pixels than this (decompression bombs)
+MAX_PIXELS = 50_000_000
+IMAGE_WORKERS = int(os.getenv("image_workers", str(min(2, os.cpu_count() or 1))))
+
+# Uploaded last, so its presence means every other file is already stored
+COMPLETION_MARKER = "medium"
+
+# Pillow format -> (extension, content type) of the stored original
+FORMATS = {
+    "JPEG": ("jpg", "image/jpeg"),
+    "PNG": ("png", "image/png"),
+    "WEBP": ("webp", "image/webp"),
+    "GIF": ("gif", "image/gif"),
+}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+class UnsupportedImage(InvalidImage):
+    """A readable image in a format we don't store"""
+
+
+class UnconvertibleImage(InvalidImage):
+    """Pillow couldn't convert the image into renditions"""
+
+
+_executor = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    # Created on first use so importing the app doesn't fork processes
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _executor
+
+
+def detect_format(content: bytes) -> str:
+    """Pillow's format for the upload; only the header is read, nothing is
+    decoded. The client's Content-Type is not trusted."""
+    from PIL import Image, UnidentifiedImageError
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    try:
+        with Image.open(BytesIO(content)) as img:
+            image_format = img.format
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise InvalidImage(f"Not a usable image: {e}") from e
+    if image_format not in FORMATS:
+        raise UnsupportedImage(f"Unsupported image format {image_format}; use JPEG, PNG, WebP or GIF")
+    return image_format
+
+
+def render_renditions(content: bytes) -> Dict[str, bytes]:
+    """Decode, orient and downscale the image into WebP renditions.
+
+    Runs in a worker process: Pillow decoding/encoding is CPU-bound and
+    would otherwise block the event loop.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    try:
+        with Image.open(BytesIO(content)) as img:
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+            renditions = {}
+            for name, edge in RENDITIONS.items():
+                copy = img.copy()
+                copy.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+                out = BytesIO()
+                copy.save(out, format="WEBP", quality=WEBP_QUALITY, method=4)
+                renditions[name] = out.getvalue()
+            return renditions
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise InvalidImage(f"Not a usable image: {e}") from e
+    except ValueError as e:
+        raise UnconvertibleImage(f"Image could not be converted: {e}") from e
+
+
+def _base_path(digest: str) -> str:
+    return f"product_images/{digest[:2]}/{digest}"
+
+
+def _urls(storage, base: str, original_path: str) -> Dict[str, str]:
+    urls = {name: storage.public_url(f"{base}/{name}.webp") for name in RENDITIONS}
+    urls["original"] = storage.public_url(original_path)
+    return urls
+
+
+async def process_upload(content: bytes) -> dict:
+    if not content:
+        raise InvalidImage("Empty upload")
+    if len(content) > MAX_UPLOAD_BYTES:
+        raise InvalidImage(f"Image is larger than {MAX_UPLOAD_BYTES} bytes")
+
+    storage = get_storage()
+    digest = hashlib.sha256(content).hexdigest()
+    base = _base_path(digest)
+    extension, content_type = FORMATS[detect_format(content)]
+    original_path = f"{base}/original.{extension}"
+
+    if await storage.exists(f"{base}/{COMPLETION_MARKER}.webp"):
+        urls = _urls(storage, base, original_path)
+        return {"image_url": urls["medium"], "hash": digest, "deduplicated": True, "renditions": urls}
+
+    loop = asyncio.get_running_loop()
+    renditions = await loop.run_in_executor(_get_executor(), render_renditions, content)
+
+    # upsert: a previous attempt may have stored some files before failing
+    await asyncio.gather(
+        storage.upload(original_path, content, content_type, upsert=True),
+        *(
+            storage.upload(f"{base}/{name}.webp", data, "image/webp", upsert=True)
+            for name, data in renditions.items() if name != COMPLETION_MARKER
+        ),
+    )
+    await storage.upload(
+        f"{base}/{COMPLETION_MARKER}.webp", renditions[COMPLETION_MARKER], "image/webp", upsert=True
+    )
+
+    urls = _urls(storage, base, original_path)
+    return {"image_url": urls["medium"], "hash": digest, "deduplicated": False, "renditions": urls}
@@ -0,0 +1,233 @@
+#log_config.py routes all logging through a bounded in-memory queue drained by a
+#background thread, so a request never waits on stdout or a log file.
+#
+#   log_level=INFO            root level
+#   log_format=json           json (one object per line) or text
+#   sql_echo=off              on: log every SQL statement (sqlalchemy.engine at INFO)
+#   log_sample_rates=sqlalchemy.engine=0.05,uvicorn.access=0.2
+#                             keep this fraction of a logger's records below WARNING
+#   log_rate_limit=200        max records per second per logger (0 = unlimited);
+#                             the next record that gets through reports how many
+#                             were dropped
+#   log_queue_size=10000      records waiting for the writer; beyond that they
+#                             are dropped and counted instead of blocking
+#
+# Every record carries the request id of the request that produced it
+# (RequestIdMiddleware), also returned to the client as X-Request-Id.
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("log_level", "INFO").upper()
+LOG_FORMAT = os.getenv("log_format", "json").lower()
+SQL_ECHO = os.getenv("sql_echo", "off").lower() in ("on", "1", "true")
+RATE_LIMIT = float(os.getenv("log_rate_limit", "200"))
+QUEUE_SIZE = int(os.getenv("log_queue_size", "10000"))
+
+
+def _parse_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        name, _, rate = part.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+SAMPLE_RATES = _parse_rates(os.getenv("log_sample_rates", "sqlalchemy.engine=0.05"))
+
+request_id: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+# -----------------------
+# Filters
+# -----------------------
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of records below WARNING for the configured loggers
+    (matched by name prefix, most specific first)."""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda kv: -len(kv[0]))
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return random.random() < rate
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per logger; one second's worth of burst."""
+
+    def __init__(self, per_second: float):
+        super().__init__()
+        self.per_second = per_second
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.per_second <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, dropped = self._buckets.get(record.name, (self.per_second, now, 0))
+            tokens = min(self.per_second, tokens + (now - updated) * self.per_second)
+            if tokens < 1:
+                self._buckets[record.name] = (tokens, now, dropped + 1)
+                return False
+            self._buckets[record.name] = (tokens - 1, now, 0)
+        if dropped:
+            record.suppressed = dropped
+        return True
+
+
+# -----------------------
+# Output
+# -----------------------
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _STANDARD_ATTRS})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full
+    rather than raising or blocking the caller."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Resolve args and tracebacks now (they may not outlive the caller)
+        # but leave formatting to the writer thread
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+_listeners = []
+
+
+def queue_handler(*handlers: logging.Handler, maxsize: int = QUEUE_SIZE) -> QueueHandler:
+    """A handler that hands records to a background thread writing to handlers."""
+    log_queue = queue.Queue(maxsize=maxsize)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return DroppingQueueHandler(log_queue)
+
+
+@atexit.register
+def _flush():
+    while _listeners:
+        _listeners.pop().stop()
+
+
+def configure():
+    """Install the queue handler on the root logger (once per process)."""
+    root = logging.getLogger()
+    if any(isinstance(h, DroppingQueueHandler) for h in root.handlers):
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    handler = queue_handler(output)
+    # Filters run on the caller's thread, before anything is queued
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(SamplingFilter(SAMPLE_RATES))
+    handler.addFilter(RateLimitFilter(RATE_LIMIT))
+
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    # Server loggers go through the same queue
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        server_logger = logging.getLogger(name)
+        server_logger.handlers.clear()
+        server_logger.propagate = True
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO if SQL_ECHO else logging.WARNING)
+
+
+# -----------------------
+# Request ids
+# -----------------------
+
+class RequestIdMiddleware:
+    """Tags each request with X-Request-Id (the caller's, or a new one) and
+    makes it available to every log record written while handling it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers", [])).get(b"x-request-id", b"").decode("latin-1")
+        rid = incoming[:64] or uuid.uuid4().hex
+        token = request_id.set(rid)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", rid.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
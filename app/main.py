@@ -1,24 +1,59 @@
-from fastapi import FastAPI, Depends, Request, UploadFile, File, HTTPException
+from fastapi import FastAPI, Depends, Request, UploadFile, File, HTTPException, Header
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from sqlalchemy.orm import Session
-import uvicorn
 import os
 from typing import List, Optional
+from datetime import datetime, date
 import json
-from fastapi.responses import JSONResponse
+import logging
+from fastapi.responses import JSONResponse, FileResponse
 
 # Local imports
-from database import SessionLocal, engine
+from database import SessionLocal, ReadSessionLocal, engine, replica_monitor, POOL_SIZE, MAX_OVERFLOW
 import models, schemas
 import crud.product_crud as pcrud
 import crud.service_crud as scrud
 import crud.order_crud as ocrud
-from storage import upload_image_to_supabase
-from models import Product, Variant, Service
+import crud.sync_crud as sync_crud
+import crud.summary_crud as summary_crud
+import crud.reconciliation_crud as reconciliation_crud
+import crud.forecast_crud as forecast_crud
+import crud.stock_crud as stock_crud
+import changes  # registers the change_log writer for /sync
+import stock_ledger  # registers the stock movement writer
+import stores
+from fastapi.staticfiles import StaticFiles
+import storage
+import image_pipeline
+from idempotency import run_idempotent
+import query_audit
+import batch
+import admission
+import tracing
+import log_config
+import profiling
+import catalog
+from response_cache import cached_json_response, MIN_COMPRESS_SIZE
+from query_audit import query_budget
+
+# All logging goes through a queue drained by a background writer
+log_config.configure()
+logger = logging.getLogger(__name__)
 
 # Initialize FastAPI
 app = FastAPI(title="Inventory-API", version="1.0.0")
 
+# Admission control: at most one DB-bound request per pooled connection, with
+# short bounded queues and checkout first. Added before CORS so CORS wraps it
+# and 503s still carry CORS headers.
+admission_controller = admission.AdmissionController(
+    capacity=int(os.getenv("admission_capacity", POOL_SIZE + MAX_OVERFLOW))
+)
+if admission.ENABLED:
+    app.add_middleware(admission.AdmissionMiddleware, controller=admission_controller)
+
 # CORS Configuration
 app.add_middleware(
     CORSMiddleware,
@@ -28,12 +63,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress everything else above the size threshold; cached collections
+# arrive already encoded and are passed through untouched.
+app.add_middleware(GZipMiddleware, minimum_size=MIN_COMPRESS_SIZE)
+
+# Dev/test only: per-request statement recording and query budgets
+if query_audit.ENABLED:
+    app.add_middleware(query_audit.QueryAuditMiddleware)
+
+# On-demand request profiling (X-Profile header or sampling); not installed
+# unless profile_token or profile_sample_rate is set
+if profiling.ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+# Request correlation id for every log record (and X-Request-Id on responses)
+app.add_middleware(log_config.RequestIdMiddleware)
+
+# Opt-in traffic capture for scripts/replay_trace.py. Added last so it is the
+# outermost layer and records admission rejections and full latency.
+if tracing.ENABLED:
+    app.add_middleware(tracing.TraceCaptureMiddleware)
+
 # Create database tables
 models.Base.metadata.create_all(bind=engine)
 
+# Branch the request works on; sessions only see that store's stock, orders
+# and payments (stores.py). Unknown stores and wrong keys get the same 403.
+def get_store_id(x_store_id: Optional[int] = Header(None), x_store_key: Optional[str] = Header(None)) -> int:
+    store_id = stores.DEFAULT_STORE_ID if x_store_id is None else x_store_id
+    if not stores.can_access(store_id, x_store_key):
+        raise HTTPException(status_code=403, detail="Not allowed to access this store")
+    return store_id
+
 # Dependency
-def get_db():
-    db = SessionLocal()
+def get_db(store_id: int = Depends(get_store_id)):
+    db = SessionLocal(info={"store_id": store_id})
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Read-only dependency for list/report endpoints; uses the replica when
+# configured and healthy, otherwise the primary.
+def get_read_db(store_id: int = Depends(get_store_id)):
+    db = ReadSessionLocal(info={"store_id": store_id})
     try:
         yield db
     finally:
@@ -47,19 +120,27 @@ def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)
     return pcrud.create_product(db=db, product=product)
 
 @app.get("/products", response_model=List[schemas.Product])
-def get_products(db: Session = Depends(get_db)):
-    return pcrud.get_products(db=db)
+@query_budget(2)
+def get_products(request: Request, db: Session = Depends(get_read_db)):
+    return cached_json_response(
+        request, f"products:store={stores.session_store(db)}", sync_crud.get_change_version(db),
+        lambda: schemas.ProductList.dump_json(
+            schemas.ProductList.validate_python(pcrud.get_products(db=db), from_attributes=True)
+        )
+    )
 
 @app.get("/search-product", response_model=List[schemas.Product])
+@query_budget(1)
 def search_products(
     search: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     return pcrud.search_products(db=db, search=search)
 
 @app.get("/products/count")
-def get_sold_count(db: Session = Depends(get_db)):
-    return {"count": ocrud.count_orders(db)}
+@query_budget(1)
+def get_sold_count(include_archived: bool = False, db: Session = Depends(get_read_db)):
+    return {"count": ocrud.count_orders(db, include_archived=include_archived)}
 
 @app.put("/products/{product_id}", response_model=schemas.Product)
 def update_product(
@@ -73,6 +154,22 @@ def update_product(
 def delete_product(product_id: int, db: Session = Depends(get_db)):
     return pcrud.delete_product(db=db, product_id=product_id)
 
+@app.put("/variants/{variant_id}", response_model=schemas.Variant)
+def update_variant(
+    variant_id: int,
+    variant: schemas.VariantCreate,
+    reason: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Update a variant; a quantity change is recorded in the stock ledger as
+    `reason` (restock or adjustment), by default by its direction"""
+    if reason is not None and reason not in (stock_ledger.RESTOCK, stock_ledger.ADJUSTMENT):
+        raise HTTPException(status_code=400, detail="reason must be restock or adjustment")
+    db_variant = pcrud.update_variant(db=db, variant_id=variant_id, variant=variant, reason=reason)
+    if db_variant is None:
+        raise HTTPException(status_code=404, detail="Variant not found")
+    return db_variant
+
 # --------------------------
 # Service Routes
 # --------------------------
@@ -81,7 +178,8 @@ def create_service(service: schemas.ServiceCreate, db: Session = Depends(get_db)
     return scrud.create_service(db=db, service=service)
 
 @app.get("/services", response_model=List[schemas.Service])
-def get_services(db: Session = Depends(get_db)):
+@query_budget(1)
+def get_services(db: Session = Depends(get_read_db)):
     return scrud.get_services(db=db)
 
 # --------------------------
@@ -90,13 +188,22 @@ def get_services(db: Session = Depends(get_db)):
 @app.post("/orders", response_model=schemas.OrderDB)
 async def create_production_order(
     order: schemas.OrderCreate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None)
 ):
     try:
-        # Process order
-        result = ocrud.create_order(db, order.dict())
+        # Process order (a retried Idempotency-Key replays the first response)
+        order_data = order.model_dump()
+        result, replayed = await run_in_threadpool(
+            run_idempotent, f"orders:store={stores.session_store(db)}", idempotency_key, order_data,
+            lambda: ocrud.create_order(db, order_data)
+        )
+        if replayed:
+            return JSONResponse(content=result, headers={"Idempotent-Replayed": "true"})
         return result
-        
+
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -104,65 +211,162 @@ async def create_production_order(
     
 
 @app.get("/orders", response_model=List[schemas.OrderDB])
-def get_orders(db: Session = Depends(get_db)):
-    return ocrud.get_orders(db=db)
+@query_budget(3)
+def get_orders(request: Request, include_archived: bool = False, db: Session = Depends(get_read_db)):
+    return cached_json_response(
+        request, f"orders:store={stores.session_store(db)}:archived={include_archived}",
+        sync_crud.get_change_version(db),
+        # get_orders already returns validated models; serialize them as they are
+        lambda: schemas.OrderResponseList.dump_json(ocrud.get_orders(db=db, include_archived=include_archived))
+    )
+
+@app.get("/order-summaries", response_model=List[schemas.OrderSummaryResponse])
+@query_budget(1)
+def get_order_summaries(
+    status: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_read_db)
+):
+    """Order list rows (item count, units, paid, balance, status) newest first"""
+    return summary_crud.get_order_summaries(
+        db=db, status=status, start=start, end=end, skip=skip, limit=limit
+    )
 
 @app.get("/sold/count")
-def get_product_count(db: Session = Depends(get_db)):
-    return {"count": ocrud.count_orders(db)}
+@query_budget(1)
+def get_product_count(include_archived: bool = False, db: Session = Depends(get_read_db)):
+    return {"count": ocrud.count_orders(db, include_archived=include_archived)}
 
 
 #---------------------------
 # Order Payment Routes
 #---------------------------
 @app.get("/order-payments", response_model=List[schemas.OrderPaymentResponse])
-def get_order_payments(db: Session = Depends(get_db)):
+@query_budget(1)
+def get_order_payments(db: Session = Depends(get_read_db)):
     """Get all order payments"""
     return ocrud.get_order_payments(db=db)
 
 @app.post("/order-payments", response_model=schemas.OrderPaymentResponse)
-def create_order_payment(payment: schemas.OrderPaymentCreate,db: Session = Depends(get_db)):
+def create_order_payment(
+    payment: schemas.OrderPaymentCreate,
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None)
+):
     """Create a new order payment"""
-    return ocrud.create_order_payment(db=db, payment=payment)
+    result, replayed = run_idempotent(
+        f"order-payments:store={stores.session_store(db)}", idempotency_key, payment.model_dump(),
+        lambda: schemas.OrderPaymentResponse.model_validate(ocrud.create_order_payment(db=db, payment=payment))
+    )
+    if replayed:
+        return JSONResponse(content=result, headers={"Idempotent-Replayed": "true"})
+    return result
 
 
 #--------------------------
 # Payment Sum
 #--------------------------
 @app.get("/total-payments", response_model=schemas.TotalPaymentsResponse)
-def get_total_payments(db: Session = Depends(get_db)):
+@query_budget(1)
+def get_total_payments(include_archived: bool = False, db: Session = Depends(get_read_db)):
     """Get total payments made"""
-    total = ocrud.get_total_payments_made(db=db)
+    total = ocrud.get_total_payments_made(db=db, include_archived=include_archived)
     return {"total_payments": total}
 
+@app.get("/reconciliation", response_model=schemas.ReconciliationResponse)
+@query_budget(1)
+def get_reconciliation(
+    day: Optional[date] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_read_db)
+):
+    """End-of-day cash check for one day (?day=) or a range (?start=&end=, inclusive)"""
+    start = start or day or date.today()
+    end = end or day or start
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if (end - start).days > 3660:
+        raise HTTPException(status_code=400, detail="Range is limited to 10 years")
+    return reconciliation_crud.get_reconciliation(db=db, start=start, end=end)
+
+@app.get("/restock", response_model=List[schemas.RestockSuggestion])
+@query_budget(3)
+def get_restock(only_reorder: bool = True, db: Session = Depends(get_read_db)):
+    """Demand forecast per variant, soonest to sell out first. Recomputed only
+    after new orders or stock changes."""
+    return forecast_crud.get_forecast(db=db, only_reorder=only_reorder)
+
+@app.get("/stock", response_model=schemas.StockAtResponse)
+@query_budget(3)
+def get_stock(at: Optional[datetime] = None, db: Session = Depends(get_read_db)):
+    """Stock per variant as it was at `at` (default now), from the nearest
+    stock snapshot plus the ledger movements since"""
+    return stock_crud.get_stock_at(db=db, at=at or datetime.now())
+
+@app.get("/stock-movements", response_model=List[schemas.StockMovementResponse])
+@query_budget(1)
+def get_stock_movements(
+    variant_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 100,
+    db: Session = Depends(get_read_db)
+):
+    """Stock ledger (sales, restocks, adjustments), newest first"""
+    return stock_crud.get_movements(db=db, variant_id=variant_id, start=start, end=end, limit=min(limit, 1000))
+
 @app.get("/service-payments", response_model=List[schemas.ServicePaymentResponse])
-def get_service_payments(db: Session = Depends(get_db)):
+@query_budget(1)
+def get_service_payments(db: Session = Depends(get_read_db)):
     """Get total payments per service"""
-    services = db.query(models.Service).all()
-    results = []
-
-    for service in services:
-        total = ocrud.get_total_payments_for_item(db=db, item_id=service.service_id, item_type='service')
-        results.append({
-            "id": service.service_id,
-            "name": service.name,
-            "total_payments": total
-        })
+    return ocrud.get_total_payments_per_service(db=db)
 
-    return results
+# --------------------------
+# Sync Routes
+# --------------------------
+@app.get("/sync")
+@query_budget(6)
+def sync(since: str = "0", limit: int = 500, db: Session = Depends(get_db)):
+    """Rows created, updated or deleted after `since`. Pass back the returned
+    cursor as the next `since`; keep paging while has_more is true. Reads the
+    primary: the cursor is only safe against the primary's running transactions."""
+    try:
+        cursor = sync_crud.parse_cursor(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+    return sync_crud.get_changes(db, since=cursor, limit=limit)
 
 # --------------------------
 # Utility Routes
 # --------------------------
+@app.post("/batch", response_model=batch.BatchResponse)
+async def run_batch(request_batch: batch.BatchRequest, request: Request):
+    """Run several GET requests in one round trip, e.g.
+    {"requests": [{"id": "products", "path": "/products"}, {"path": "/total-payments"}]}"""
+    return await batch.run_batch(app, request_batch, request.headers)
+
 @app.post("/upload-image")
 async def upload_image(image: UploadFile = File(...)):
+    """Store thumb/medium/large WebP renditions under the image's content hash.
+    image_url is the medium rendition; all URLs are under renditions."""
     content = await image.read()
-    url = await upload_image_to_supabase(
-        file_name=image.filename,
-        file_content=content,
-        content_type=image.content_type
-    )
-    return {"image_url": url}
+    try:
+        return await image_pipeline.process_upload(content)
+    except image_pipeline.UnsupportedImage as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except image_pipeline.UnconvertibleImage as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except image_pipeline.InvalidImage as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Local stand-in for Supabase storage (storage_backend=local)
+if storage.STORAGE_BACKEND == "local":
+    os.makedirs(storage.LOCAL_STORAGE_DIR, exist_ok=True)
+    app.mount("/local-storage", StaticFiles(directory=storage.LOCAL_STORAGE_DIR), name="local-storage")
 
 @app.get("/user-info")
 async def log_info(request: Request):
@@ -171,14 +375,55 @@ async def log_info(request: Request):
         "user_agent": request.headers.get("User-Agent"),
         "language": request.headers.get("Accept-Language")
     }
-    print(f"Client info: {client_info}")
+    logger.info("client info", extra={"client": client_info})
     return client_info
 
 
+@app.get("/metrics/admission")
+def admission_metrics():
+    """Per route class: active requests, queue depth, admitted/rejected counts"""
+    return admission_controller.metrics()
+
+@app.get("/metrics/logging")
+def logging_metrics():
+    """Records dropped because the log queue was full"""
+    return {"dropped": log_config.DroppingQueueHandler.dropped}
+
+@app.get("/profiles")
+def list_profiles(x_profile: Optional[str] = Header(None)):
+    """Recently captured request profiles (newest first)"""
+    if not profiling.authorized(x_profile):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled or X-Profile is wrong")
+    return profiling.list_profiles()
+
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, summary: bool = False, x_profile: Optional[str] = Header(None)):
+    """A captured profile as a speedscope file (open it at speedscope.app), or
+    with ?summary=true just its duration and sqlalchemy/pydantic/crud/app split"""
+    if not profiling.authorized(x_profile):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled or X-Profile is wrong")
+    if summary:
+        result = profiling.read_summary(profile_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return result
+    path = profiling.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=f"{profile_id}.speedscope.json")
+
+@app.get("/health/replica")
+def replica_health():
+    return replica_monitor.status()
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Inventory API"}
 
+# Bounded: looks only at the ids in the payload (capped), checked against the
+# in-memory catalog snapshot rather than dumping tables
+DEBUG_MAX_ITEMS = 100
+
 @app.post("/debug-order")
 async def debug_order(
     request: Request,  # Changed from 'order' to raw request
@@ -187,53 +432,57 @@ async def debug_order(
     """Endpoint to catch ALL validation errors"""
     try:
         raw_data = await request.json()
-        print("\n🔥 RAW REQUEST DATA:")
-        print(raw_data)
-
-        # Manually validate basic structure
-        if "items" not in raw_data:
-            return JSONResponse(
-                status_code=422,
-                content={"detail": "Missing 'items' array"}
-            )
-
-        # Print database state
-        print("\n📦 DATABASE STATE:")
-        print("Products:", [p[0] for p in db.query(Product.product_id).all()])
-        print("Variants:", [(v[0], v[1]) for v in db.query(Variant.variant_id, Variant.product_id).all()])
-        print("Services:", [s[0] for s in db.query(Service.service_id).all()])
-
-        # Try parsing with your schema
-        try:
-            order = schemas.OrderCreate(**raw_data)
-            return {
-                "status": "VALID",
-                "order": order.dict(),
-                "calculated_total": sum(
-                    item.price * item.quantity 
-                    for item in order.items
-                ) - order.discount
-            }
-        except Exception as e:
-            print("\n❌ SCHEMA VALIDATION ERROR:")
-            print(str(e))
-            return JSONResponse(
-                status_code=422,
-                content={
-                    "detail": "Schema validation failed",
-                    "error": str(e),
-                    "received_data": raw_data
-                }
-            )
-
     except json.JSONDecodeError:
         return JSONResponse(
             status_code=422,
             content={"detail": "Invalid JSON format"}
         )
-    
+
+    # Manually validate basic structure
+    if not isinstance(raw_data, dict) or not isinstance(raw_data.get("items"), list):
+        return JSONResponse(
+            status_code=422,
+            content={"detail": "Missing 'items' array"}
+        )
+    items = raw_data["items"]
+    logger.debug("debug-order payload", extra={"items": len(items)})
+    if len(items) > DEBUG_MAX_ITEMS:
+        return JSONResponse(
+            status_code=422,
+            content={"detail": f"At most {DEBUG_MAX_ITEMS} items can be checked", "items": len(items)}
+        )
+
+    # Try parsing with your schema
+    try:
+        order = schemas.OrderCreate.model_validate(raw_data)
+    except Exception as e:
+        logger.info("debug-order schema error", extra={"error": str(e)[:500]})
+        return JSONResponse(
+            status_code=422,
+            content={
+                "detail": "Schema validation failed",
+                "error": str(e),
+                "items": len(items),
+            }
+        )
+
+    # Products, variants, services and prices this order refers to
+    order_data = order.model_dump()
+    snapshot = await run_in_threadpool(catalog.get_snapshot, db)
+    return {
+        "status": "VALID",
+        "order": order_data,
+        "calculated_total": sum(
+            item.price * item.quantity 
+            for item in order.items
+        ) - order.discount,
+        "catalog_version": snapshot.version,
+        "catalog_problems": snapshot.check_items(order_data["items"]),
+    }
+
 
 if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 8000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=False)
+    # Production entry point: pre-forked workers sized to the machine (see serve.py)
+    import serve
+    serve.main()
 
@@ -0,0 +1,31 @@
+-- no-transaction
+-- Indexes for the hot foreign keys and date filters. Built CONCURRENTLY so
+-- the tables stay writable while the migration runs. Names match the ones
+-- models.py gives fresh databases through create_all.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_order_items_order_id
+    ON order_items (order_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_order_items_product_id
+    ON order_items (product_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_order_items_service_id
+    ON order_items (service_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_order_payments_order_id
+    ON order_payments (order_id) INCLUDE (amount);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_variants_product_id_size
+    ON variants (product_id, size);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_orders_order_date
+    ON orders (order_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sales_records_date
+    ON sales_records (date);
+
+ANALYZE order_items;
+ANALYZE order_payments;
+ANALYZE variants;
+ANALYZE orders;
+ANALYZE sales_records;
@@ -0,0 +1,25 @@
+-- Change log behind GET /sync, backfilled with one upsert per existing row so
+-- a client syncing from cursor 0 receives the whole catalog and order history.
+
+CREATE TABLE IF NOT EXISTS change_log (
+    seq BIGSERIAL PRIMARY KEY,
+    entity VARCHAR NOT NULL,
+    entity_id INTEGER NOT NULL,
+    op VARCHAR NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+);
+
+INSERT INTO change_log (entity, entity_id, op, changed_at)
+SELECT 'product', product_id, 'upsert', now() - interval '1 minute' FROM products;
+
+INSERT INTO change_log (entity, entity_id, op, changed_at)
+SELECT 'variant', variant_id, 'upsert', now() - interval '1 minute' FROM variants;
+
+INSERT INTO change_log (entity, entity_id, op, changed_at)
+SELECT 'service', service_id, 'upsert', now() - interval '1 minute' FROM services;
+
+INSERT INTO change_log (entity, entity_id, op, changed_at)
+SELECT 'order', order_id, 'upsert', now() - interval '1 minute' FROM orders;
+
+INSERT INTO change_log (entity, entity_id, op, changed_at)
+SELECT 'order_payment', payment_id, 'upsert', now() - interval '1 minute' FROM order_payments;
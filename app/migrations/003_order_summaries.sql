@@ -0,0 +1,43 @@
+-- Order summary read model, backfilled from the order tables. Later changes
+-- are kept in step by the order/payment write paths; rebuild at any time with
+-- python -m scripts.rebuild_order_summaries.
+
+CREATE TABLE IF NOT EXISTS order_summaries (
+    order_id INTEGER PRIMARY KEY REFERENCES orders (order_id) ON DELETE CASCADE,
+    order_date TIMESTAMP NOT NULL,
+    total_price FLOAT NOT NULL,
+    item_count INTEGER NOT NULL,
+    units INTEGER NOT NULL,
+    amount_paid FLOAT NOT NULL,
+    balance FLOAT NOT NULL,
+    status VARCHAR NOT NULL,
+    last_payment_date TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_order_summaries_order_date ON order_summaries (order_date);
+
+CREATE INDEX IF NOT EXISTS ix_order_summaries_status_order_date ON order_summaries (status, order_date);
+
+INSERT INTO order_summaries
+    (order_id, order_date, total_price, item_count, units, amount_paid, balance, status, last_payment_date, updated_at)
+SELECT o.order_id,
+       o.order_date,
+       COALESCE(o.total_price, 0),
+       COALESCE(i.item_count, 0),
+       COALESCE(i.units, 0),
+       COALESCE(p.amount_paid, 0),
+       COALESCE(o.total_price, 0) - COALESCE(p.amount_paid, 0),
+       o.payment_status,
+       p.last_payment_date,
+       now()
+FROM orders o
+LEFT JOIN (
+    SELECT order_id, count(*) AS item_count, sum(quantity) AS units
+    FROM order_items GROUP BY order_id
+) i ON i.order_id = o.order_id
+LEFT JOIN (
+    SELECT order_id, sum(amount) AS amount_paid, max(payment_date) AS last_payment_date
+    FROM order_payments GROUP BY order_id
+) p ON p.order_id = o.order_id
+ON CONFLICT (order_id) DO NOTHING;
@@ -0,0 +1,37 @@
+-- Archive tables for closed, fully paid orders (python -m scripts.archive_orders).
+-- 004, 006 and 007 read or alter them, so they must exist before those run on a
+-- database that has never been through create_all. store_id is added by 006.
+
+CREATE TABLE IF NOT EXISTS orders_archive (
+    order_id INTEGER PRIMARY KEY,
+    order_date TIMESTAMP NOT NULL,
+    total_price FLOAT,
+    payment_status VARCHAR NOT NULL,
+    archived_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_orders_archive_order_date ON orders_archive (order_date);
+
+CREATE TABLE IF NOT EXISTS order_items_archive (
+    order_item_id INTEGER PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES orders_archive (order_id),
+    product_id INTEGER,
+    variant_id INTEGER,
+    service_id INTEGER,
+    quantity INTEGER NOT NULL,
+    price FLOAT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_order_items_archive_order_id ON order_items_archive (order_id);
+
+CREATE TABLE IF NOT EXISTS order_payments_archive (
+    payment_id INTEGER PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES orders_archive (order_id),
+    amount FLOAT NOT NULL,
+    payment_date TIMESTAMP NOT NULL,
+    status VARCHAR NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_order_payments_archive_order_id ON order_payments_archive (order_id);
@@ -0,0 +1,57 @@
+-- Per-day cash buckets behind GET /reconciliation, backfilled from payments
+-- (hot and archived), cashouts and sales records. Rebuild at any time with
+-- python -m scripts.rebuild_cash_buckets.
+
+CREATE TABLE IF NOT EXISTS daily_cash_buckets (
+    day DATE PRIMARY KEY,
+    payments_total FLOAT NOT NULL DEFAULT 0,
+    payments_count INTEGER NOT NULL DEFAULT 0,
+    cashouts_total FLOAT NOT NULL DEFAULT 0,
+    cashouts_count INTEGER NOT NULL DEFAULT 0,
+    opening_cash FLOAT,
+    closing_cash FLOAT,
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_daily_cashout_transactions_cashout_date
+    ON daily_cashout_transactions (cashout_date);
+
+-- One row per day that has payments, cashouts or sales records. No conflict
+-- target: the table may already exist with the later (store_id, day) key
+-- if the app created it before this ran. Days already present are left
+-- alone (python -m scripts.rebuild_cash_buckets recomputes them).
+INSERT INTO daily_cash_buckets
+    (day, payments_total, payments_count, cashouts_total, cashouts_count, opening_cash, closing_cash, updated_at)
+SELECT d.day,
+       coalesce(p.total, 0), coalesce(p.n, 0),
+       coalesce(c.total, 0), coalesce(c.n, 0),
+       s.opening_cash, s.closing_cash, now()
+FROM (
+    SELECT payment_date::date AS day FROM order_payments
+    UNION SELECT payment_date::date FROM order_payments_archive
+    UNION SELECT cashout_date::date FROM daily_cashout_transactions
+    UNION SELECT date::date FROM sales_records
+) d
+LEFT JOIN (
+    SELECT payment_date::date AS day, sum(amount) AS total, count(*) AS n
+    FROM (
+        SELECT payment_date, amount FROM order_payments
+        UNION ALL
+        SELECT payment_date, amount FROM order_payments_archive
+    ) all_payments
+    GROUP BY payment_date::date
+) p ON p.day = d.day
+LEFT JOIN (
+    SELECT cashout_date::date AS day, sum(amount) AS total, count(*) AS n
+    FROM daily_cashout_transactions
+    GROUP BY cashout_date::date
+) c ON c.day = d.day
+LEFT JOIN (
+    SELECT DISTINCT ON (date::date)
+           date::date AS day,
+           first_value(opening_cash) OVER (PARTITION BY date::date ORDER BY date, record_id) AS opening_cash,
+           closing_cash
+    FROM sales_records
+    ORDER BY date::date, date DESC, record_id DESC
+) s ON s.day = d.day
+ON CONFLICT DO NOTHING;
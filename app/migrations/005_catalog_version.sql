@@ -0,0 +1,11 @@
+-- Catalog version counter read by catalog.py to decide when a worker's
+-- in-memory price/existence snapshot is stale.
+
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+);
+
+INSERT INTO catalog_version (id, version) VALUES (1, 1)
+ON CONFLICT (id) DO NOTHING;
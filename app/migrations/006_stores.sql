@@ -0,0 +1,62 @@
+-- no-transaction
+-- Store (branch) key on stock, orders, payments, sales records, cashouts and
+-- their read models/archives. Existing rows belong to store 1. Indexes lead
+-- with store_id and are built CONCURRENTLY so the tables stay writable.
+
+ALTER TABLE variants ADD COLUMN IF NOT EXISTS store_id INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS store_id INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE order_items ADD COLUMN IF NOT EXISTS store_id INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE order_payments ADD COLUMN IF NOT EXISTS store_id INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE sales_records ADD COLUMN IF NOT EXISTS store_id INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE daily_cashout_transactions ADD COLUMN IF NOT EXISTS store_id INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE order_summaries ADD COLUMN IF NOT EXISTS store_id INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE orders_archive ADD COLUMN IF NOT EXISTS store_id INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE order_items_archive ADD COLUMN IF NOT EXISTS store_id INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE order_payments_archive ADD COLUMN IF NOT EXISTS store_id INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE daily_cash_buckets ADD COLUMN IF NOT EXISTS store_id INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE change_log ADD COLUMN IF NOT EXISTS store_id INTEGER;
+
+-- Cash buckets are per store and day now (re-runnable: the key is rebuilt
+-- whichever of the two it currently is)
+ALTER TABLE daily_cash_buckets
+    DROP CONSTRAINT IF EXISTS daily_cash_buckets_pkey,
+    ADD PRIMARY KEY (store_id, day);
+
+-- Catalog entries (products, services) stay shared with a null store
+UPDATE change_log SET store_id = 1
+WHERE store_id IS NULL AND entity IN ('variant', 'order', 'order_payment');
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_variants_store_id_product_id_size
+    ON variants (store_id, product_id, size);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_orders_store_id_order_date
+    ON orders (store_id, order_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_order_items_store_id_variant_id
+    ON order_items (store_id, variant_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_order_payments_store_id_payment_date
+    ON order_payments (store_id, payment_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sales_records_store_id_date
+    ON sales_records (store_id, date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_daily_cashout_transactions_store_id_cashout_date
+    ON daily_cashout_transactions (store_id, cashout_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_order_summaries_store_id_status_order_date
+    ON order_summaries (store_id, status, order_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_order_summaries_store_id_order_date
+    ON order_summaries (store_id, order_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_orders_archive_store_id_order_date
+    ON orders_archive (store_id, order_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_change_log_store_id_seq
+    ON change_log (store_id, seq);
+
+-- Superseded by the store-leading indexes above
+DROP INDEX CONCURRENTLY IF EXISTS ix_variants_product_id_size;
+DROP INDEX CONCURRENTLY IF EXISTS ix_order_summaries_status_order_date;
+DROP INDEX CONCURRENTLY IF EXISTS ix_order_summaries_order_date;
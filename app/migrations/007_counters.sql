@@ -0,0 +1,28 @@
+-- Sharded running counters behind /products/count, /sold/count and
+-- /total-payments, backfilled per store into shard 0. Drift can be corrected
+-- at any time with python -m scripts.reconcile_counters.
+
+CREATE TABLE IF NOT EXISTS counters (
+    store_id INTEGER NOT NULL DEFAULT 1,
+    name VARCHAR NOT NULL,
+    shard INTEGER NOT NULL,
+    value FLOAT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (store_id, name, shard)
+);
+
+INSERT INTO counters (store_id, name, shard, value, updated_at)
+SELECT store_id, 'order_items', 0, count(*), now() FROM order_items GROUP BY store_id
+ON CONFLICT DO NOTHING;
+
+INSERT INTO counters (store_id, name, shard, value, updated_at)
+SELECT store_id, 'order_items_archived', 0, count(*), now() FROM order_items_archive GROUP BY store_id
+ON CONFLICT DO NOTHING;
+
+INSERT INTO counters (store_id, name, shard, value, updated_at)
+SELECT store_id, 'payments_total', 0, sum(amount), now() FROM order_payments GROUP BY store_id
+ON CONFLICT DO NOTHING;
+
+INSERT INTO counters (store_id, name, shard, value, updated_at)
+SELECT store_id, 'payments_total_archived', 0, sum(amount), now() FROM order_payments_archive GROUP BY store_id
+ON CONFLICT DO NOTHING;
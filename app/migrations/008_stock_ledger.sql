@@ -0,0 +1,41 @@
+-- Append-only stock movement ledger (stock_ledger.py) and periodic per-variant
+-- stock snapshots (scripts/snapshot_stock.py). Seeds one snapshot of the
+-- current stock so point-in-time queries have a starting point.
+
+CREATE TABLE IF NOT EXISTS stock_movements (
+    movement_id BIGSERIAL PRIMARY KEY,
+    store_id INTEGER NOT NULL DEFAULT 1,
+    variant_id INTEGER NOT NULL,
+    kind VARCHAR NOT NULL,
+    delta INTEGER NOT NULL,
+    quantity_after INTEGER NOT NULL,
+    order_id INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE INDEX IF NOT EXISTS ix_stock_movements_store_id_movement_id ON stock_movements (store_id, movement_id);
+CREATE INDEX IF NOT EXISTS ix_stock_movements_store_id_created_at ON stock_movements (store_id, created_at);
+CREATE INDEX IF NOT EXISTS ix_stock_movements_variant_id_movement_id ON stock_movements (variant_id, movement_id);
+
+CREATE TABLE IF NOT EXISTS stock_snapshots (
+    store_id INTEGER NOT NULL DEFAULT 1,
+    taken_at TIMESTAMP NOT NULL,
+    variant_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    last_movement_id BIGINT NOT NULL,
+    PRIMARY KEY (store_id, taken_at, variant_id)
+);
+
+-- As in take_snapshot (crud/stock_crud.py): ledger writers wait while the
+-- seed is taken, so every movement up to last_movement_id is committed and
+-- already counted in the quantities, and none is stamped before taken_at.
+LOCK TABLE stock_movements IN SHARE MODE;
+
+WITH snapshot AS MATERIALIZED (
+    SELECT clock_timestamp()::timestamp AS taken_at,
+           (SELECT coalesce(max(movement_id), 0) FROM stock_movements) AS last_movement_id
+)
+INSERT INTO stock_snapshots (store_id, taken_at, variant_id, quantity, last_movement_id)
+SELECT v.store_id, snapshot.taken_at, v.variant_id, v.quantity, snapshot.last_movement_id
+FROM variants v CROSS JOIN snapshot
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,14 @@
+-- no-transaction
+-- Commit-ordered /sync cursor: every change_log row records the transaction
+-- that wrote it, and /sync pages in (txid, seq) order, only ever returning
+-- rows of transactions older than the oldest one still running. Rows written
+-- before this migration get txid 0, so an old numeric cursor N reads as (0, N).
+-- Needs PostgreSQL 13+ (pg_current_xact_id).
+
+ALTER TABLE change_log ADD COLUMN IF NOT EXISTS txid BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE change_log ALTER COLUMN txid SET DEFAULT pg_current_xact_id()::text::bigint;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_change_log_txid_seq
+    ON change_log (txid, seq);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_change_log_store_id_txid_seq
+    ON change_log (store_id, txid, seq);
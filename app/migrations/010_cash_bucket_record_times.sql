@@ -0,0 +1,26 @@
+-- Dates of the sales records behind each bucket's opening and closing cash,
+-- so add_sales_record keeps the earliest and latest record by date instead
+-- of by insertion order. Existing buckets are recomputed from sales_records.
+
+ALTER TABLE daily_cash_buckets
+    ADD COLUMN IF NOT EXISTS opening_at TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS closing_at TIMESTAMP;
+
+UPDATE daily_cash_buckets b
+SET opening_cash = s.opening_cash,
+    opening_at = s.opening_at,
+    closing_cash = s.closing_cash,
+    closing_at = s.closing_at
+FROM (
+    SELECT DISTINCT ON (store_id, date::date)
+           store_id,
+           date::date AS day,
+           first_value(opening_cash) OVER w AS opening_cash,
+           first_value(date) OVER w AS opening_at,
+           closing_cash,
+           date AS closing_at
+    FROM sales_records
+    WINDOW w AS (PARTITION BY store_id, date::date ORDER BY date, record_id)
+    ORDER BY store_id, date::date, date DESC, record_id DESC
+) s
+WHERE b.store_id = s.store_id AND b.day = s.day;
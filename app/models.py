@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, CheckConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Date, DateTime, ForeignKey, CheckConstraint, Index, func, text
+from sqlalchemy.orm import column_property, relationship
 from database import Base
 from datetime import datetime
 
@@ -18,11 +18,17 @@ class Product(Base):
 
 class Variant(Base):
     __tablename__ = 'variants'
+    __table_args__ = (
+        # Also serves plain product_id lookups (joinedload of Product.variants)
+        Index('ix_variants_store_id_product_id_size', 'store_id', 'product_id', 'size'),
+    )
 
     variant_id = Column(Integer, primary_key=True, index=True)
+    store_id = Column(Integer, nullable=False, server_default='1')
     product_id = Column(Integer, ForeignKey('products.product_id'), nullable=False)
     size = Column(String, nullable=True)
-    quantity = Column(Integer, default=0, nullable=False)
+    # Old value always loaded on change so stock_ledger.py can record the delta
+    quantity = column_property(Column(Integer, default=0, nullable=False), active_history=True)
     selling_price = Column(Float, nullable=False)
     item_cost = Column(Float, nullable=False)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
@@ -44,9 +50,13 @@ class Service(Base):
 
 class Order(Base):
     __tablename__ = 'orders'
+    __table_args__ = (
+        Index('ix_orders_store_id_order_date', 'store_id', 'order_date'),
+    )
 
     order_id = Column(Integer, primary_key=True, index=True)
-    order_date = Column(DateTime, default=datetime.now, nullable=False)
+    store_id = Column(Integer, nullable=False, server_default='1')
+    order_date = Column(DateTime, default=datetime.now, nullable=False, index=True)
     total_price = Column(Float)
     payment_status = Column(String, default='pending', nullable=False)  # e.g., 'pending', 'paid', 'cancelled'
 
@@ -64,17 +74,19 @@ class OrderItem(Base):
             '(product_id IS NULL AND service_id IS NOT NULL)',
             name='check_product_or_service'
         ),
+        Index('ix_order_items_store_id_variant_id', 'store_id', 'variant_id'),
     )
 
     order_item_id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey('orders.order_id'), nullable=False)
+    order_id = Column(Integer, ForeignKey('orders.order_id'), nullable=False, index=True)
+    store_id = Column(Integer, nullable=False, server_default='1')
     
     # Product fields (mutually exclusive with service)
-    product_id = Column(Integer, ForeignKey('products.product_id'), nullable=True)
+    product_id = Column(Integer, ForeignKey('products.product_id'), nullable=True, index=True)
     variant_id = Column(Integer, ForeignKey('variants.variant_id'), nullable=True)
     
     # Service field (mutually exclusive with product)
-    service_id = Column(Integer, ForeignKey('services.service_id'), nullable=True)
+    service_id = Column(Integer, ForeignKey('services.service_id'), nullable=True, index=True)
     
     quantity = Column(Integer, default=1, nullable=False)
     price = Column(Float, nullable=False)  # Price at time of purchase
@@ -88,8 +100,14 @@ class OrderItem(Base):
 
 class OrderPayment(Base):
     __tablename__ = 'order_payments'
+    __table_args__ = (
+        # Covering index: per-order paid totals are answered from the index alone
+        Index('ix_order_payments_order_id', 'order_id', postgresql_include=['amount']),
+        Index('ix_order_payments_store_id_payment_date', 'store_id', 'payment_date'),
+    )
 
     payment_id = Column(Integer, primary_key=True, index=True)
+    store_id = Column(Integer, nullable=False, server_default='1')
     order_id = Column(Integer, ForeignKey('orders.order_id'), nullable=False)
     amount = Column(Float, nullable=False)
     payment_date = Column(DateTime, default=datetime.now, nullable=False) # e.g., 'cash', 'card', 'online'
@@ -102,9 +120,13 @@ class OrderPayment(Base):
 
 class SalesRecord(Base):
     __tablename__ = 'sales_records'
+    __table_args__ = (
+        Index('ix_sales_records_store_id_date', 'store_id', 'date'),
+    )
 
     record_id = Column(Integer, primary_key=True, index=True)
-    date = Column(DateTime, default=datetime.now, nullable=False)
+    store_id = Column(Integer, nullable=False, server_default='1')
+    date = Column(DateTime, default=datetime.now, nullable=False, index=True)
     total_sales = Column(Float, nullable=False)  
     closing_cash = Column(Float, nullable=False) #default=500.00
     opening_cash = Column(Float, nullable=False) #default=500.00
@@ -119,11 +141,216 @@ class SalesRecord(Base):
 
 class CashoutTransaction(Base):
     __tablename__ = 'daily_cashout_transactions'
+    __table_args__ = (
+        Index('ix_daily_cashout_transactions_store_id_cashout_date', 'store_id', 'cashout_date'),
+    )
 
     cashout_id = Column(Integer, primary_key=True, index=True)
-    cashout_date = Column(DateTime, default=datetime.now, nullable=False)
+    store_id = Column(Integer, nullable=False, server_default='1')
+    cashout_date = Column(DateTime, default=datetime.now, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.now, nullable=False)
     amount = Column(Float, nullable=False)
     reason = Column(String, nullable=False)
 
-    # No relationship needed as this is a standalone transaction
\ No newline at end of file
+    # No relationship needed as this is a standalone transaction
+
+# -----------------------
+# Daily cash buckets
+# -----------------------
+# One row per store and day with running payment/cashout totals and the day's opening
+# and closing cash, kept up to date by the payment, cashout and sales record
+# writes (crud/reconciliation_crud.py). Reconciling a day reads one row.
+
+class DailyCashBucket(Base):
+    __tablename__ = 'daily_cash_buckets'
+
+    store_id = Column(Integer, primary_key=True, server_default='1')
+    day = Column(Date, primary_key=True)
+    payments_total = Column(Float, nullable=False, default=0.0)
+    payments_count = Column(Integer, nullable=False, default=0)
+    cashouts_total = Column(Float, nullable=False, default=0.0)
+    cashouts_count = Column(Integer, nullable=False, default=0)
+    opening_cash = Column(Float, nullable=True)  # from the day's first sales record
+    closing_cash = Column(Float, nullable=True)  # from the day's latest sales record
+    opening_at = Column(DateTime, nullable=True)  # date of the record opening_cash came from
+    closing_at = Column(DateTime, nullable=True)  # date of the record closing_cash came from
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, server_default=func.now(), nullable=False)
+
+
+# -----------------------
+# Order summary read model
+# -----------------------
+# Narrow per-order projection for list/dashboard views, maintained by
+# crud/summary_crud.py in the same transaction as the order/payment writes.
+
+class OrderSummary(Base):
+    __tablename__ = 'order_summaries'
+    __table_args__ = (
+        Index('ix_order_summaries_store_id_status_order_date', 'store_id', 'status', 'order_date'),
+        Index('ix_order_summaries_store_id_order_date', 'store_id', 'order_date'),
+    )
+
+    order_id = Column(Integer, ForeignKey('orders.order_id', ondelete='CASCADE'), primary_key=True)
+    store_id = Column(Integer, nullable=False, server_default='1')
+    order_date = Column(DateTime, nullable=False)
+    total_price = Column(Float, nullable=False, default=0.0)
+    item_count = Column(Integer, nullable=False, default=0)  # order lines
+    units = Column(Integer, nullable=False, default=0)  # sum of line quantities
+    amount_paid = Column(Float, nullable=False, default=0.0)
+    balance = Column(Float, nullable=False, default=0.0)
+    status = Column(String, nullable=False, default='pending')
+    last_payment_date = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, nullable=False)
+
+
+# -----------------------
+# Order history archive
+# -----------------------
+# Closed, fully paid orders older than the retention window are moved here by
+# archive.py so the hot order tables and their indexes stay small. Same
+# columns as the hot tables; ids are kept so references stay meaningful.
+
+class OrderArchive(Base):
+    __tablename__ = 'orders_archive'
+    __table_args__ = (
+        Index('ix_orders_archive_store_id_order_date', 'store_id', 'order_date'),
+    )
+
+    order_id = Column(Integer, primary_key=True)
+    store_id = Column(Integer, nullable=False, server_default='1')
+    order_date = Column(DateTime, nullable=False, index=True)
+    total_price = Column(Float)
+    payment_status = Column(String, nullable=False)
+    archived_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    items = relationship("OrderItemArchive", back_populates="order")
+    payments = relationship("OrderPaymentArchive", back_populates="order")
+
+
+class OrderItemArchive(Base):
+    __tablename__ = 'order_items_archive'
+
+    order_item_id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey('orders_archive.order_id'), nullable=False, index=True)
+    store_id = Column(Integer, nullable=False, server_default='1')
+    product_id = Column(Integer, nullable=True)
+    variant_id = Column(Integer, nullable=True)
+    service_id = Column(Integer, nullable=True)
+    quantity = Column(Integer, nullable=False)
+    price = Column(Float, nullable=False)
+
+    order = relationship("OrderArchive", back_populates="items")
+
+
+class OrderPaymentArchive(Base):
+    __tablename__ = 'order_payments_archive'
+
+    payment_id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, ForeignKey('orders_archive.order_id'), nullable=False, index=True)
+    store_id = Column(Integer, nullable=False, server_default='1')
+    amount = Column(Float, nullable=False)
+    payment_date = Column(DateTime, nullable=False)
+    status = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    order = relationship("OrderArchive", back_populates="payments")
+
+
+# -----------------------
+# Change log for delta sync
+# -----------------------
+# One row per created/updated/deleted Product, Variant, Service, Order and
+# OrderPayment, written in the same transaction as the change (changes.py).
+# seq is the sync cursor; clients ask for everything after the last seq they saw.
+# store_id is null for the shared catalog (products, services).
+
+class ChangeLog(Base):
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        Index('ix_change_log_store_id_seq', 'store_id', 'seq'),
+        Index('ix_change_log_txid_seq', 'txid', 'seq'),
+        Index('ix_change_log_store_id_txid_seq', 'store_id', 'txid', 'seq'),
+    )
+
+    seq = Column(BigInteger, primary_key=True, autoincrement=True)
+    entity = Column(String, nullable=False)  # 'product', 'variant', 'service', 'order', 'order_payment'
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)  # 'upsert' or 'delete'
+    store_id = Column(Integer, nullable=True)
+    changed_at = Column(DateTime, server_default=func.clock_timestamp(), nullable=False)
+    # Writing transaction; /sync pages in (txid, seq) order (crud/sync_crud.py)
+    txid = Column(BigInteger, server_default=text("pg_current_xact_id()::text::bigint"), nullable=False)
+
+
+# -----------------------
+# Catalog version
+# -----------------------
+# Single row bumped (catalog.py) whenever a product, variant or service is
+# added or removed or a price changes. Stock changes don't bump it. Workers
+# compare it with their in-memory catalog snapshot to know when to reload.
+
+class CatalogVersion(Base):
+    __tablename__ = 'catalog_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.clock_timestamp(), onupdate=func.clock_timestamp(), nullable=False)
+
+
+# -----------------------
+# Counters
+# -----------------------
+# Running totals for dashboard figures (items sold, payments received), kept
+# per store in a few shards so concurrent checkouts rarely update the same
+# row. A counter's value is the sum of its shards. Written by the order and
+# payment paths (crud/counter_crud.py) and corrected by
+# scripts/reconcile_counters.py.
+
+class Counter(Base):
+    __tablename__ = 'counters'
+
+    store_id = Column(Integer, primary_key=True, server_default='1')
+    name = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    value = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, server_default=func.now(), nullable=False)
+
+
+# -----------------------
+# Stock ledger
+# -----------------------
+# Append-only history of every variant quantity change (stock_ledger.py),
+# written in the same transaction as the change. No foreign key to variants:
+# the history outlives deleted variants.
+
+class StockMovement(Base):
+    __tablename__ = 'stock_movements'
+    __table_args__ = (
+        Index('ix_stock_movements_store_id_movement_id', 'store_id', 'movement_id'),
+        Index('ix_stock_movements_store_id_created_at', 'store_id', 'created_at'),
+        Index('ix_stock_movements_variant_id_movement_id', 'variant_id', 'movement_id'),
+    )
+
+    movement_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    store_id = Column(Integer, nullable=False, server_default='1')
+    variant_id = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)  # 'sale', 'restock' or 'adjustment'
+    delta = Column(Integer, nullable=False)
+    quantity_after = Column(Integer, nullable=False)
+    order_id = Column(Integer, nullable=True)  # for sales
+    created_at = Column(DateTime, server_default=func.clock_timestamp(), nullable=False)
+
+
+# Every variant's quantity as of taken_at, written periodically by
+# scripts/snapshot_stock.py. last_movement_id is the newest movement already
+# included, so stock at a later time is a snapshot plus the movements after it.
+
+class StockSnapshot(Base):
+    __tablename__ = 'stock_snapshots'
+
+    store_id = Column(Integer, primary_key=True, server_default='1')
+    taken_at = Column(DateTime, primary_key=True)
+    variant_id = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False)
+    last_movement_id = Column(BigInteger, nullable=False)
@@ -0,0 +1,336 @@
+#profiling.py captures a wall-clock sampling profile of individual requests and
+#stores it as a speedscope file (https://www.speedscope.app) to fetch later.
+#
+#   profile_token=<secret>        profile a request sent with X-Profile: <secret>
+#   profile_sample_rate=0.001     also profile this fraction of all requests
+#   profile_interval_ms=5         sampling interval
+#   profile_dir=profiles          where profiles are written
+#   profile_keep=200              newest profiles kept on disk
+#
+# With neither profile_token nor profile_sample_rate set nothing is installed,
+# so there is no overhead. A profiled response carries X-Profile-Id; fetch the
+# file with GET /profiles/<id> (X-Profile: <secret> required).
+#
+# A background thread snapshots the stacks of the threads working on the
+# request every interval, whether they are running or waiting (e.g. on
+# Postgres). Those are the event loop thread and every threadpool thread
+# that runs a query for the request (registered via SQLAlchemy events,
+# contextvars carry the request into the threadpool). A threadpool thread is
+# dropped once the app code that ran the query returns, so it isn't sampled
+# after it moves on to other requests. Samples taken on the event loop may
+# include other requests' async work. Each sample is also
+# attributed to the innermost layer it was in: sqlalchemy (incl. the
+# driver), pydantic, crud or app code.
+import asyncio
+import contextvars
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from types import FrameType
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+load_dotenv()
+
+TOKEN = os.getenv("profile_token")
+SAMPLE_RATE = float(os.getenv("profile_sample_rate", "0"))
+INTERVAL = float(os.getenv("profile_interval_ms", "5")) / 1000
+PROFILE_DIR = os.getenv("profile_dir", "profiles")
+KEEP = int(os.getenv("profile_keep", "200"))
+ENABLED = bool(TOKEN) or SAMPLE_RATE > 0
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+CATEGORIES = ("sqlalchemy", "pydantic", "crud", "app", "other")
+
+
+def authorized(value: Optional[str]) -> bool:
+    return bool(TOKEN) and value is not None and hmac.compare_digest(value.encode(), TOKEN.encode())
+
+
+def _category(filename: str) -> Optional[str]:
+    if "sqlalchemy" in filename or "psycopg" in filename:
+        return "sqlalchemy"
+    if "pydantic" in filename:
+        return "pydantic"
+    if filename.startswith(APP_DIR):
+        return "crud" if os.sep + "crud" + os.sep in filename else "app"
+    return None
+
+
+class ProfileSession:
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        # thread id -> frame the thread works for the request under (None:
+        # the whole request, i.e. the event loop thread)
+        self.threads: Dict[int, Optional[FrameType]] = {threading.get_ident(): None}
+        # (thread id, wall ms since the previous sample, stack of code objects)
+        self.samples: List[Tuple[int, float, Tuple]] = []
+        self.started = time.perf_counter()
+        self.duration = 0.0
+
+    def sample(self, frames, weight_ms: float):
+        for thread_id, anchor in list(self.threads.items()):
+            frame = frames.get(thread_id)
+            stack = []
+            working = anchor is None
+            while frame is not None:
+                stack.append((frame.f_code, frame.f_lineno))
+                working = working or frame is anchor
+                frame = frame.f_back
+            if not working:
+                # Done with this request's work; unmark unless re-marked meanwhile
+                if self.threads.get(thread_id) is anchor:
+                    self.threads.pop(thread_id, None)
+                continue
+            if stack:
+                self.samples.append((thread_id, weight_ms, tuple(reversed(stack))))
+
+    def speedscope(self) -> dict:
+        frame_index: Dict[Tuple, int] = {}
+        frames: List[dict] = []
+        breakdown = {c: 0.0 for c in CATEGORIES}
+        per_thread: Dict[int, Tuple[List[List[int]], List[float]]] = {}
+
+        for thread_id, weight, stack in self.samples:
+            indexes = []
+            category = "other"
+            for code, _ in stack:
+                key = (code.co_filename, code.co_firstlineno, code.co_name)
+                if key not in frame_index:
+                    frame_index[key] = len(frames)
+                    frames.append({
+                        "name": getattr(code, "co_qualname", code.co_name),
+                        "file": code.co_filename,
+                        "line": code.co_firstlineno,
+                    })
+                indexes.append(frame_index[key])
+                category = _category(code.co_filename) or category
+            breakdown[category] += weight
+            samples, weights = per_thread.setdefault(thread_id, ([], []))
+            samples.append(indexes)
+            weights.append(round(weight, 3))
+
+        total = sum(breakdown.values()) or 1.0
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.method} {self.path}",
+            "exporter": "inventory-api profiling.py",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": f"thread {thread_id}",
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+                for thread_id, (samples, weights) in per_thread.items()
+            ],
+            # Not part of the speedscope format; ignored by the viewer
+            "summary": {
+                "duration_ms": round(self.duration * 1000, 2),
+                "samples": len(self.samples),
+                "breakdown": {c: round(n / total, 3) for c, n in breakdown.items()},
+            },
+        }
+
+
+# -----------------------
+# Sampler
+# -----------------------
+# One thread for the whole process, running only while a profile is active.
+
+_current: contextvars.ContextVar[Optional[ProfileSession]] = contextvars.ContextVar("profile", default=None)
+_active: List[ProfileSession] = []
+_lock = threading.Lock()
+_sampler: Optional[threading.Thread] = None
+
+
+def _run_sampler():
+    global _sampler
+    me = threading.get_ident()
+    last = time.perf_counter()
+    while True:
+        with _lock:
+            if not _active:
+                _sampler = None
+                return
+            sessions = list(_active)
+        # Weight by the real gap: ticks stretch when the GIL is busy
+        now = time.perf_counter()
+        weight_ms = min(now - last, 10 * INTERVAL) * 1000
+        last = now
+        frames = sys._current_frames()
+        frames.pop(me, None)
+        for session in sessions:
+            session.sample(frames, weight_ms)
+        time.sleep(INTERVAL)
+
+
+def _start(session: ProfileSession):
+    global _sampler
+    with _lock:
+        _active.append(session)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_run_sampler, name="request-profiler", daemon=True)
+            _sampler.start()
+
+
+def _stop(session: ProfileSession):
+    with _lock:
+        _active.remove(session)
+    session.duration = time.perf_counter() - session.started
+
+
+def _on_stack(frame: Optional[FrameType], target: FrameType) -> bool:
+    while frame is not None:
+        if frame is target:
+            return True
+        frame = frame.f_back
+    return False
+
+
+def _app_frame(frame: Optional[FrameType]) -> Optional[FrameType]:
+    """Outermost app frame on the stack: the endpoint or dependency the
+    threadpool is running for the request."""
+    found = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR) and filename != __file__:
+            found = frame
+        frame = frame.f_back
+    return found
+
+
+def mark_thread(*args, **kwargs):
+    """Include the calling thread in the current request's profile while the
+    app code that issued the query is running."""
+    session = _current.get()
+    if session is None:
+        return
+    thread_id = threading.get_ident()
+    caller = sys._getframe(1)
+    # .get: the sampler may unmark the thread concurrently
+    marked = session.threads.get(thread_id, False)
+    if marked is None or (marked and _on_stack(caller, marked)):
+        return
+    anchor = _app_frame(caller)
+    if anchor is not None:
+        session.threads[thread_id] = anchor
+
+
+def install():
+    if not event.contains(Engine, "before_cursor_execute", mark_thread):
+        event.listen(Engine, "before_cursor_execute", mark_thread)
+        event.listen(Session, "do_orm_execute", mark_thread)
+
+
+# -----------------------
+# Storage
+# -----------------------
+
+def profile_path(profile_id: str) -> Optional[str]:
+    if not profile_id.isalnum():
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.speedscope.json")
+    return path if os.path.exists(path) else None
+
+
+def _write(session: ProfileSession):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{session.id}.speedscope.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(session.speedscope(), f, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+
+    for _, old in sorted(_saved_profiles())[:-KEEP]:
+        try:
+            os.remove(old)
+        except FileNotFoundError:
+            pass  # another request (or worker) pruned it first
+
+
+def _saved_profiles() -> List[Tuple[float, str]]:
+    """(mtime, path) of every saved profile, skipping ones pruned meanwhile."""
+    found = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(".speedscope.json"):
+            path = os.path.join(PROFILE_DIR, name)
+            try:
+                found.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                pass
+    return found
+
+
+def list_profiles(limit: int = 50) -> List[dict]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    entries = [
+        {"id": os.path.basename(path).split(".")[0], "created": created}
+        for created, path in _saved_profiles()
+    ]
+    return sorted(entries, key=lambda e: -e["created"])[:limit]
+
+
+def read_summary(profile_id: str) -> Optional[dict]:
+    path = profile_path(profile_id)
+    if path is None:
+        return None
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None  # pruned since profile_path looked
+    return {"id": profile_id, "name": data["name"], **data["summary"]}
+
+
+# -----------------------
+# Middleware
+# -----------------------
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        install()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/profiles"):
+            await self.app(scope, receive, send)
+            return
+        requested = dict(scope.get("headers", [])).get(b"x-profile")
+        if not (
+            (requested is not None and authorized(requested.decode("latin-1")))
+            or (SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(scope["method"], scope["path"])
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", session.id.encode())]
+            await send(message)
+
+        token = _current.set(session)
+        _start(session)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _stop(session)
+            _current.reset(token)
+            await asyncio.get_running_loop().run_in_executor(None, _write, session)
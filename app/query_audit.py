@@ -0,0 +1,159 @@
+#query_audit.py records every SQL statement per request in dev/test mode, flags
+#repeated statement shapes (N+1) and enforces per-route query budgets.
+#
+#   query_audit=warn    log offenders and add X-Query-Count to responses
+#   query_audit=strict  additionally turn budget violations into 500s (tests)
+#
+# Off by default; when off no listener or middleware is installed.
+import contextvars
+import logging
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+load_dotenv()
+
+MODE = os.getenv("query_audit", "").lower()
+ENABLED = MODE in ("warn", "strict")
+STRICT = MODE == "strict"
+# A shape seen this many times in one request is reported as a likely N+1
+REPEAT_THRESHOLD = int(os.getenv("query_audit_repeat_threshold", "3"))
+
+logger = logging.getLogger(__name__)
+
+_recorder: contextvars.ContextVar[Optional["QueryRecorder"]] = contextvars.ContextVar(
+    "query_recorder", default=None
+)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# Expanded IN lists: (%(p_1)s, %(p_2)s, ...) -> (?)
+_PARAM_LISTS = re.compile(r"\((?:\s*(?:%\([^)]*\)s|\?|\$\d+|:\w+)\s*,?)+\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    shape = _LITERALS.sub("?", statement)
+    shape = _PARAM_LISTS.sub("(?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def repeated_shapes(self, threshold: int = REPEAT_THRESHOLD):
+        shapes = Counter(statement_shape(s) for s in self.statements)
+        return {shape: n for shape, n in shapes.items() if n >= threshold}
+
+    def problems(self, budget: Optional[int] = None) -> List[str]:
+        found = []
+        if budget is not None and self.count > budget:
+            found.append(f"{self.count} queries, budget is {budget}")
+        for shape, n in self.repeated_shapes().items():
+            found.append(f"statement repeated {n}x (possible N+1): {shape[:200]}")
+        return found
+
+    def assert_budget(self, budget: int):
+        if self.count > budget:
+            listing = "\n".join(f"  {i + 1}. {s}" for i, s in enumerate(self.statements))
+            raise QueryBudgetExceeded(f"{self.count} queries, budget is {budget}:\n{listing}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    recorder = _recorder.get()
+    if recorder is None:
+        return
+    if context is not None and context.execution_options.get("query_audit_ignore"):
+        return
+    recorder.statements.append(statement)
+
+
+def install():
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+
+
+@contextmanager
+def record_queries():
+    """Record the statements run inside the block, in any thread it spawns
+    through the threadpool (contextvars are copied there)."""
+    install()
+    recorder = QueryRecorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+def query_budget(max_queries: int) -> Callable:
+    """Declare how many statements a route may issue.
+
+        @app.get("/products")
+        @query_budget(1)
+        def get_products(...): ...
+    """
+    def decorator(fn):
+        fn.__query_budget__ = max_queries
+        return fn
+    return decorator
+
+
+class QueryAuditMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        replaced = False
+
+        async def audited_send(message):
+            nonlocal replaced
+            if message["type"] == "http.response.start":
+                endpoint = scope.get("endpoint")
+                budget = getattr(endpoint, "__query_budget__", None)
+                problems = recorder.problems(budget)
+                route = f"{scope['method']} {scope['path']}"
+                if problems:
+                    logger.warning("query audit %s: %s", route, "; ".join(problems))
+                over_budget = budget is not None and recorder.count > budget
+                if STRICT and over_budget:
+                    replaced = True
+                    body = ("query budget exceeded for " + route + ": " + "; ".join(problems)).encode()
+                    await send({
+                        "type": "http.response.start",
+                        "status": 500,
+                        "headers": [(b"content-type", b"text/plain"), (b"content-length", str(len(body)).encode())],
+                    })
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-query-count", str(recorder.count).encode())
+                ]
+            elif replaced:
+                return
+            await send(message)
+
+        with record_queries() as recorder:
+            await self.app(scope, receive, audited_send)
+
+
+if ENABLED:
+    install()
@@ -0,0 +1,125 @@
+#response_cache.py caches serialized collection payloads together with their
+#gzip/brotli encodings, so repeat requests skip the DB, serialization and
+#compression and just pick the bytes matching Accept-Encoding.
+#
+# Entries are keyed by route and tagged with a data version (the /sync
+# watermark, see sync_crud.get_change_version). A new version rebuilds the entry. ttl bounds how stale an
+# entry can get for changes that don't go through the change log.
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from dotenv import load_dotenv
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+load_dotenv()
+
+# Bodies smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = int(os.getenv("compress_min_size", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+CACHE_TTL = float(os.getenv("response_cache_ttl_seconds", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("response_cache_max_entries", "64"))
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
+
+
+def negotiate(accept_encoding: Optional[str], size: int) -> Optional[str]:
+    """Best encoding the client accepts: br, then gzip, else identity."""
+    if not accept_encoding or size < MIN_COMPRESS_SIZE:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class CachedPayload:
+    def __init__(self, body: bytes, version):
+        self.body = body
+        self.version = version
+        self.built_at = time.monotonic()
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: Optional[str]) -> bytes:
+        if encoding is None:
+            return self.body
+        data = self._encoded.get(encoding)
+        if data is None:
+            with self._lock:
+                data = self._encoded.get(encoding)
+                if data is None:
+                    data = self._encoded[encoding] = compress(self.body, encoding)
+        return data
+
+
+class ResponseCache:
+    def __init__(self, ttl: float = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedPayload]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, key: str, version, build: Callable[[], bytes]) -> CachedPayload:
+        entry = self._entries.get(key)
+        if entry is not None and entry.version == version and time.monotonic() - entry.built_at < self.ttl:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        entry = CachedPayload(build(), version)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = ResponseCache()
+
+
+def cached_json_response(request: Request, key: str, version, build: Callable[[], bytes]) -> Response:
+    """Serve a JSON collection from the cache, compressed to match the request."""
+    payload = cache.get_or_build(key, version, build)
+    headers = {"ETag": payload.etag, "Vary": "Accept-Encoding, X-Store-Id, X-Store-Key"}
+    if request.headers.get("if-none-match") == payload.etag:
+        return Response(status_code=304, headers=headers)
+
+    encoding = negotiate(request.headers.get("accept-encoding"), len(payload.body))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=payload.encoded(encoding), media_type="application/json", headers=headers)
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field, root_validator, validator
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, model_validator
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, date
 
 # Variant Schemas (unchanged)
 class VariantBase(BaseModel):
@@ -16,9 +16,8 @@ class Variant(VariantBase):
     variant_id: int
     product_id: int
     updated_at: datetime
-    
-    class Config:
-        orm_mode = True
+
+    model_config = ConfigDict(from_attributes=True)
 
 # Product Schemas (unchanged)
 class ProductBase(BaseModel):
@@ -34,9 +33,8 @@ class Product(ProductBase):
     product_id: int
     created_at: datetime
     variants: List[Variant] = []
-    
-    class Config:
-        orm_mode = True
+
+    model_config = ConfigDict(from_attributes=True)
 
 # Service Schemas (unchanged)
 class ServiceBase(BaseModel):
@@ -51,9 +49,8 @@ class ServiceCreate(ServiceBase):
 class Service(ServiceBase):
     service_id: int
     created_at: datetime
-    
-    class Config:
-        orm_mode = True
+
+    model_config = ConfigDict(from_attributes=True)
 
 
 class OrderItemCreate(BaseModel):
@@ -67,72 +64,50 @@ class OrderItemCreate(BaseModel):
     )
     variant_id: Optional[int] = Field(
         None,
-        description="Requires product_id"
+        description="Required for products (stock and price are per variant)"
     )
     quantity: int = Field(..., gt=0)
     price: float = Field(..., gt=0)
 
-    @root_validator(pre=True)
-    def validate_item(cls, values):
+    @model_validator(mode="after")
+    def validate_item(self):
         # Ensure either product OR service is specified
-        has_product = values.get('product_id') is not None
-        has_service = values.get('service_id') is not None
-        
+        has_product = self.product_id is not None
+        has_service = self.service_id is not None
+
         if not has_product and not has_service:
             raise ValueError("Item must specify product_id or service_id")
         if has_product and has_service:
             raise ValueError("Item cannot be both product and service")
-        
+
         # Validate variant belongs to product
-        if values.get('variant_id') and not has_product:
+        if self.variant_id is not None and not has_product:
             raise ValueError("Variant requires product_id")
-            
-        return values
+        if has_product and self.variant_id is None:
+            raise ValueError("Product item requires variant_id")
+
+        return self
 
 class OrderCreate(BaseModel):
-    items: List[OrderItemCreate] = Field(..., min_items=1)
+    items: List[OrderItemCreate] = Field(..., min_length=1)
     discount: float = Field(0.0, ge=0)
     total_price: float = Field(..., ge=0)
 
-    @validator('total_price')
-    def validate_total(cls, v, values):
-        items = values.get('items', [])
-        discount = values.get('discount', 0)
-        
-        calculated = sum(
-            item.price * item.quantity 
-            for item in items
-        ) - discount
-        
-        if abs(v - calculated) > 0.01:
+    # Runs once the items are validated; one pass over the cart
+    @model_validator(mode="after")
+    def validate_total(self):
+        subtotal = 0.0
+        for item in self.items:
+            subtotal += item.price * item.quantity
+        calculated = subtotal - self.discount
+
+        if abs(self.total_price - calculated) > 0.01:
             raise ValueError(
                 f"Price mismatch. Expected: {calculated:.2f}\n"
-                f"Calculation: sum({[i.price*i.quantity for i in items]}) - {discount} = {calculated}"
+                f"Calculation: sum({[i.price*i.quantity for i in self.items]}) - {self.discount} = {calculated}"
             )
-        return v
-    
-class OrderItemBase(BaseModel):
-    product_id: Optional[int] = Field(
-        None,
-        description="Required if not a service"
-    )
-    service_id: Optional[int] = Field(
-        None,
-        description="Required if not a product"
-    )
-    variant_id: Optional[int] = Field(
-        None,
-        description="Requires product_id"
-    )
-    quantity: int = Field(..., gt=0)
-    price: float = Field(..., gt=0)
+        return self
 
-class OrderItemCreate(OrderItemBase):
-    @validator('variant_id')
-    def validate_variant(cls, v, values):
-        if v and not values.get('product_id'):
-            raise ValueError("Variant requires product_id")
-        return v
 class OrderItemDB(BaseModel):
     order_item_id: int
     order_id: int
@@ -149,9 +124,8 @@ class OrderDB(BaseModel):
     payment_status: Optional[str] = None# e.g., 'pending', 'paid', 'cancelled'
     items: List[OrderItemDB] = []
     payments: Optional[List['OrderPaymentResponse']] = None  # List of OrderPaymentResponse
-    
-    class Config:
-        orm_mode = True
+
+    model_config = ConfigDict(from_attributes=True)
 
 
 #Response Schemas
@@ -165,8 +139,7 @@ class OrderItemResponse(BaseModel):
     quantity: int
     price: float
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class OrderResponse(BaseModel):
     order_id: int
@@ -176,8 +149,7 @@ class OrderResponse(BaseModel):
     items: List[OrderItemResponse]
     payments: Optional[List['OrderPaymentResponse']] = None 
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 #order payment schemas
@@ -188,8 +160,7 @@ class OrderPaymentBase(BaseModel):
     payment_date: Optional[datetime] = None
     status: str = "completed"
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class OrderPaymentCreate(OrderPaymentBase):
@@ -210,8 +181,7 @@ class SalesRecordBase(BaseModel):
     remit_amount: float = 0.0
     remarks: Optional[str] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class SalesRecordCreate(SalesRecordBase):
     cashout_transaction_id: Optional[int] = None
@@ -227,8 +197,7 @@ class CashoutTransactionBase(BaseModel):
     reason: str
     cashout_date: Optional[datetime] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class CashoutTransactionCreate(CashoutTransactionBase):
@@ -248,8 +217,41 @@ class OrderPaymentResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class OrderSummaryResponse(BaseModel):
+    order_id: int
+    order_date: datetime
+    total_price: float
+    item_count: int
+    units: int
+    amount_paid: float
+    balance: float
+    status: str
+    last_payment_date: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ReconciliationDay(BaseModel):
+    day: date
+    opening_cash: Optional[float] = None
+    payments_total: float
+    payments_count: int
+    cashouts_total: float
+    cashouts_count: int
+    expected_cash: Optional[float] = None  # opening + payments - cashouts
+    closing_cash: Optional[float] = None
+    variance: Optional[float] = None  # closing - expected
+
+class ReconciliationResponse(BaseModel):
+    start: date
+    end: date
+    payments_total: float
+    payments_count: int
+    cashouts_total: float
+    cashouts_count: int
+    variance_total: float
+    days: List[ReconciliationDay]
 
 class TotalPaymentsResponse(BaseModel):
     total_payments: float
@@ -258,15 +260,56 @@ class ServicePaymentResponse(BaseModel):
     service_id: int
     name: str
     total_payments: float    
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ProductPaymentResponse(BaseModel):
     product_id: int
     total_payments: float
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
         
-OrderResponse.update_forward_refs()
-OrderDB.update_forward_refs()
\ No newline at end of file
+OrderResponse.model_rebuild()
+OrderDB.model_rebuild()
+class RestockSuggestion(BaseModel):
+    variant_id: int
+    product_id: int
+    name: Optional[str] = None
+    color: Optional[str] = None
+    size: Optional[str] = None
+    stock: int
+    units_sold: int  # over the forecast window
+    ma_7: float
+    ma_28: float
+    daily_demand: float
+    sell_through: float  # sold / (sold + stock)
+    days_of_stock: Optional[float] = None  # None when nothing is selling
+    reorder_point: float
+    reorder_qty: int
+
+
+#stock ledger schemas
+class StockMovementResponse(BaseModel):
+    movement_id: int
+    variant_id: int
+    kind: str  # 'sale', 'restock' or 'adjustment'
+    delta: int
+    quantity_after: int
+    order_id: Optional[int] = None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class StockLevel(BaseModel):
+    variant_id: int
+    quantity: int
+
+class StockAtResponse(BaseModel):
+    at: datetime
+    snapshot_at: Optional[datetime] = None  # None: rolled back from current stock
+    movements: int  # ledger rows applied on top of the snapshot
+    items: List[StockLevel]
+
+
+# Validators for list payloads, built once and reused by every request
+ProductList = TypeAdapter(List[Product])
+OrderResponseList = TypeAdapter(List[OrderResponse])
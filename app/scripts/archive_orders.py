@@ -0,0 +1,33 @@
+#archive_orders.py moves closed, fully paid orders older than N months to the
+#archive tables. Safe to run repeatedly (e.g. nightly from cron).
+#
+#   cd app && python -m scripts.archive_orders --months 6 [--store 1]
+import argparse
+import sys
+
+import models
+from archive import archive_orders, vacuum_hot_tables
+from database import SessionLocal, engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive old, fully paid orders")
+    parser.add_argument("--months", type=int, default=12, help="keep this many months in the hot tables")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM ANALYZE the hot tables afterwards")
+    parser.add_argument("--store", type=int, help="only this store (default: every store)")
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine)
+    info = {} if args.store is None else {"store_id": args.store}
+    with SessionLocal(info=info) as db:
+        moved = archive_orders(db, older_than_months=args.months, batch_size=args.batch_size)
+    print(f"Archived {moved} order(s) older than {args.months} month(s)")
+
+    if args.vacuum and moved:
+        vacuum_hot_tables(engine)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+#check_query_plans.py runs the CRUD functions against a seeded database, EXPLAINs
+#every SELECT they issue and fails on sequential scans or plan-cost regressions.
+#
+#   cd app && python -m scripts.check_query_plans --seed         # empty scratch db only
+#   cd app && python -m scripts.check_query_plans                # check against baseline
+#   cd app && python -m scripts.check_query_plans --update-baseline
+#
+# Point .env at a scratch database: --seed refuses to touch non-empty tables.
+# Exit status is 1 when any check fails, so this can gate CI.
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+from sqlalchemy import event, text
+
+import models
+from database import SessionLocal, engine
+import crud.order_crud as ocrud
+import crud.product_crud as pcrud
+import crud.service_crud as scrud
+import crud.stock_crud as stock_crud
+import stores
+from schemas import OrderPaymentCreate
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_plan_baseline.json")
+# Relative cost increase tolerated before a plan counts as a regression
+COST_TOLERANCE = 0.25
+# Rows --seed creates (orders can be overridden)
+SEED_COUNTS = {"products": 2000, "services": 50, "orders": 50000, "days": 730}
+
+SEED_SQL = [
+    """INSERT INTO products (name, description, color, created_at, image_url)
+       SELECT 'Shirt ' || g, NULL, (ARRAY['black','white','red','navy'])[1 + g % 4], now(), 'seed.png'
+       FROM generate_series(1, :products) g""",
+    """INSERT INTO variants (product_id, size, quantity, selling_price, item_cost, updated_at)
+       SELECT p.product_id, s.size, 50, 350, 180, now()
+       FROM products p CROSS JOIN (VALUES ('S'), ('M'), ('L'), ('XL')) AS s(size)""",
+    """INSERT INTO services (name, size, print_price, created_at, image_url)
+       SELECT 'Print ' || g, 'A4', 120, now(), 'seed.png' FROM generate_series(1, :services) g""",
+    """INSERT INTO orders (order_date, total_price, payment_status)
+       SELECT now() - (g || ' minutes')::interval, 700, 'complete'
+       FROM generate_series(1, :orders) g""",
+    """INSERT INTO order_items (order_id, product_id, variant_id, service_id, quantity, price)
+       SELECT o.order_id, v.product_id, v.variant_id, NULL, 2, 350
+       FROM orders o JOIN variants v ON v.variant_id = 1 + (o.order_id * 7) % (SELECT count(*) FROM variants)""",
+    """INSERT INTO order_items (order_id, product_id, variant_id, service_id, quantity, price)
+       SELECT o.order_id, NULL, NULL, 1 + o.order_id % :services, 1, 120
+       FROM orders o WHERE o.order_id % 3 = 0""",
+    """INSERT INTO order_payments (order_id, amount, payment_date, status, created_at, updated_at)
+       SELECT order_id, 700, order_date, 'completed', order_date, order_date FROM orders""",
+    """INSERT INTO sales_records (date, total_sales, closing_cash, opening_cash, trasaction_count, remit_amount, created_at)
+       SELECT now() - (g || ' days')::interval, 10000, 500, 500, 30, 9500, now()
+       FROM generate_series(1, :days) g""",
+    """INSERT INTO stock_snapshots (store_id, taken_at, variant_id, quantity, last_movement_id)
+       SELECT store_id, now() - interval '2 days', variant_id, quantity, 0 FROM variants""",
+    """INSERT INTO stock_movements (store_id, variant_id, kind, delta, quantity_after, order_id, created_at)
+       SELECT o.store_id, i.variant_id, 'sale', -i.quantity, 48, o.order_id, o.order_date
+       FROM orders o JOIN order_items i ON i.order_id = o.order_id WHERE i.variant_id IS NOT NULL""",
+]
+
+
+def sample_ids(db):
+    return {
+        "product_id": db.execute(text("SELECT min(product_id) FROM products")).scalar(),
+        "service_id": db.execute(text("SELECT min(service_id) FROM services")).scalar(),
+        "order_id": db.execute(text("SELECT max(order_id) FROM orders")).scalar(),
+        "date": db.execute(text("SELECT max(date) FROM sales_records")).scalar(),
+        "variant_id": db.execute(text("SELECT min(variant_id) FROM variants")).scalar(),
+    }
+
+
+# name -> (call, tables allowed to be sequentially scanned). Full-table reads
+# legitimately scan; selective lookups must use an index.
+def cases(ids):
+    return {
+        "get_products": (lambda db: pcrud.get_products(db), {"products", "variants"}),
+        "search_products": (lambda db: pcrud.search_products(db, "black"), {"products", "variants"}),
+        "get_variants_by_product": (lambda db: pcrud.get_variants_by_product(db, ids["product_id"]), set()),
+        "get_services": (lambda db: scrud.get_services(db), {"services"}),
+        # A few dozen services fit in a page or two; a scan is the cheaper plan
+        "get_service": (lambda db: scrud.get_service(db, ids["service_id"]), {"services"}),
+        "get_orders": (lambda db: ocrud.get_orders(db), {"orders", "order_items", "order_payments"}),
+        "count_orders": (lambda db: ocrud.count_orders(db), {"counters"}),
+        "get_total_payments_made": (lambda db: ocrud.get_total_payments_made(db), {"counters"}),
+        # The item's orders come from an index; their payments are hash-joined,
+        # which beats one index probe per order at this selectivity
+        "get_total_payments_for_item": (
+            lambda db: ocrud.get_total_payments_for_item(db, ids["service_id"], "service"), {"order_payments"}
+        ),
+        "create_order_payment": (
+            lambda db: ocrud.create_order_payment(
+                db, OrderPaymentCreate(order_id=ids["order_id"], amount=0.01)
+            ),
+            set(),
+        ),
+        "get_sales_records": (lambda db: ocrud.get_sales_records(db), set()),
+        "get_sales_record_by_date": (lambda db: ocrud.get_sales_record_by_date(db, ids["date"]), set()),
+        # Reads a whole snapshot and (in the seed) every movement since it
+        "get_stock_at": (
+            lambda db: stock_crud.get_stock_at(db, datetime.now()), {"stock_snapshots", "stock_movements"}
+        ),
+        "get_movements": (lambda db: stock_crud.get_movements(db, variant_id=ids["variant_id"]), set()),
+    }
+
+
+def capture_selects(call):
+    """Run call in a transaction that is rolled back, returning its SELECTs."""
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    # Scoped like a request session so plans include the store_id criteria
+    db = SessionLocal(
+        bind=connection, join_transaction_mode="create_savepoint",
+        info={"store_id": stores.DEFAULT_STORE_ID},
+    )
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        call(db)
+    except Exception as e:
+        # e.g. create_order_payment refusing an overpayment after its reads ran
+        print(f"    (call raised {type(e).__name__}: {e})")
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        db.close()
+        transaction.rollback()
+        connection.close()
+    return captured
+
+
+def explain(statement, parameters):
+    with engine.connect() as conn:
+        cursor = conn.connection.cursor()
+        cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+        return cursor.fetchone()[0][0]["Plan"]
+
+
+def seq_scans(plan):
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def indexes_used(plan):
+    found = []
+    if "Index Name" in plan:
+        found.append(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        found.extend(indexes_used(child))
+    return found
+
+
+def seed(counts):
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT count(*) FROM products")).scalar():
+            raise SystemExit("refusing to seed: products is not empty (use a scratch database)")
+        for statement in SEED_SQL:
+            conn.execute(text(statement), counts)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EXPLAIN the CRUD queries and check their plans")
+    parser.add_argument("--seed", action="store_true", help="seed an empty scratch database first")
+    parser.add_argument("--orders", type=int, default=SEED_COUNTS["orders"])
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine)
+    if args.seed:
+        seed({**SEED_COUNTS, "orders": args.orders})
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH) and not args.update_baseline:
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+
+    with SessionLocal() as db:
+        ids = sample_ids(db)
+
+    costs, failures = {}, []
+    for name, (call, allowed_seq) in cases(ids).items():
+        print(name)
+        for i, (statement, parameters) in enumerate(capture_selects(call)):
+            key = f"{name}#{i}"
+            plan = explain(statement, parameters)
+            cost = plan["Total Cost"]
+            costs[key] = cost
+            bad_scans = [t for t in seq_scans(plan) if t not in allowed_seq]
+            if bad_scans:
+                failures.append(f"{key}: sequential scan on {', '.join(bad_scans)}")
+            previous = baseline.get(key)
+            if previous and cost > previous * (1 + COST_TOLERANCE):
+                failures.append(f"{key}: cost {cost:.0f} vs baseline {previous:.0f}")
+            print(f"  #{i} cost={cost:.1f} seq_scans={seq_scans(plan) or '-'}")
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({"generated_at": datetime.now().isoformat(), **costs}, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {BASELINE_PATH}")
+
+    if failures:
+        print("\nFAILED")
+        for failure in failures:
+            print("  " + failure)
+        return 1
+    print("\nAll query plans OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
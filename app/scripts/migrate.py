@@ -0,0 +1,94 @@
+#migrate.py applies the SQL files in app/migrations that haven't run yet.
+#
+#   cd app && python -m scripts.migrate          # apply pending migrations
+#   cd app && python -m scripts.migrate --list   # show applied/pending
+#
+# Files run in name order. A file runs in one transaction unless its first
+# line is "-- no-transaction" (needed for CREATE INDEX CONCURRENTLY), in which
+# case each statement is committed on its own. Statements end with a ";" at
+# the end of a line; $$-quoted bodies may contain semicolons.
+import argparse
+import os
+import sys
+
+from sqlalchemy import text
+
+from database import engine
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+
+CREATE_TABLE = text("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version VARCHAR PRIMARY KEY,
+        applied_at TIMESTAMP NOT NULL DEFAULT now()
+    )
+""")
+
+
+def split_statements(sql: str):
+    statements, current, in_dollar = [], [], False
+    for line in sql.splitlines():
+        stripped = line.strip()
+        if not current and (not stripped or stripped.startswith("--")):
+            continue
+        current.append(line)
+        if line.count("$$") % 2:
+            in_dollar = not in_dollar
+        if stripped.endswith(";") and not in_dollar:
+            statements.append("\n".join(current))
+            current = []
+    if current and "".join(current).strip():
+        statements.append("\n".join(current))
+    return statements
+
+
+def migration_files():
+    return sorted(f for f in os.listdir(MIGRATIONS_DIR) if f.endswith(".sql"))
+
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def apply(engine, name: str):
+    with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+        sql = f.read()
+    statements = split_statements(sql)
+    record = text("INSERT INTO schema_migrations (version) VALUES (:version)")
+
+    if sql.startswith("-- no-transaction"):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+            conn.execute(record, {"version": name})
+    else:
+        with engine.begin() as conn:
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+            conn.execute(record, {"version": name})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply pending SQL migrations")
+    parser.add_argument("--list", action="store_true", help="only show migration status")
+    args = parser.parse_args(argv)
+
+    with engine.begin() as conn:
+        conn.execute(CREATE_TABLE)
+        done = applied_versions(conn)
+
+    pending = [name for name in migration_files() if name not in done]
+    if args.list:
+        for name in migration_files():
+            print(f"{'applied' if name in done else 'pending'}  {name}")
+        return 0
+
+    for name in pending:
+        print(f"Applying {name}")
+        apply(engine, name)
+    print(f"{len(pending)} migration(s) applied")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+#rebuild_cash_buckets.py recomputes the daily_cash_buckets behind
+#/reconciliation from payments, cashouts and sales records.
+#
+#   cd app && python -m scripts.rebuild_cash_buckets [--store 1]
+import argparse
+import sys
+
+import models
+from crud.reconciliation_crud import rebuild_cash_buckets
+from database import SessionLocal, engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the daily cash buckets")
+    parser.add_argument("--store", type=int, help="only this store (default: every store)")
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine)
+    info = {} if args.store is None else {"store_id": args.store}
+    with SessionLocal(info=info) as db:
+        count = rebuild_cash_buckets(db)
+    print(f"Rebuilt {count} daily cash buckets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
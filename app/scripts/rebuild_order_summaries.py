@@ -0,0 +1,27 @@
+#rebuild_order_summaries.py recomputes the order_summaries read model from the
+#order tables (after a restore, a manual data fix, or to verify it).
+#
+#   cd app && python -m scripts.rebuild_order_summaries [--store 1]
+import argparse
+import sys
+
+import models
+from crud.summary_crud import rebuild_order_summaries
+from database import SessionLocal, engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the order_summaries read model")
+    parser.add_argument("--store", type=int, help="only this store (default: every store)")
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine)
+    info = {} if args.store is None else {"store_id": args.store}
+    with SessionLocal(info=info) as db:
+        count = rebuild_order_summaries(db)
+    print(f"Rebuilt {count} order summaries")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
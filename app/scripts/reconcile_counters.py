@@ -0,0 +1,30 @@
+#reconcile_counters.py recounts the items-sold and payments counters from the
+#order tables and corrects any drift. Writers to the counters wait while it
+#runs (a few aggregate queries), so schedule it off-peak, e.g. nightly from cron.
+#
+#   cd app && python -m scripts.reconcile_counters [--store 1]
+import argparse
+import sys
+
+import models
+from crud.counter_crud import reconcile_counters
+from database import SessionLocal, engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recount the running counters")
+    parser.add_argument("--store", type=int, help="only this store (default: every store)")
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine)
+    info = {} if args.store is None else {"store_id": args.store}
+    with SessionLocal(info=info) as db:
+        corrections = reconcile_counters(db)
+    for counter, drift in sorted(corrections.items()):
+        print(f"  {counter}: corrected by {drift:+g}")
+    print(f"{len(corrections)} counter(s) corrected")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#replay_trace.py re-drives captured request traces (see tracing.py) against a
+#local instance and compares latency and errors with what was recorded.
+#
+#   cd app && python -m scripts.replay_trace traces/api-*.jsonl* --target http://localhost:8000 --speed 2
+#
+# Requests are sent in recorded order at their recorded spacing divided by
+# --speed, so the same trace always produces the same load profile. Replay
+# against a scratch database: POSTs are re-sent and create real rows.
+# Requests whose body wasn't recorded (uploads) are skipped.
+import argparse
+import asyncio
+import glob
+import json
+import re
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+_IDS = re.compile(r"/\d+(?=/|$)")
+
+
+def route_of(method: str, path: str) -> str:
+    return f"{method} {_IDS.sub('/{id}', path)}"
+
+
+def load(patterns):
+    records = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            with open(path) as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def replayable(record) -> bool:
+    body = record.get("body")
+    return not (isinstance(body, dict) and "_omitted_bytes" in body)
+
+
+def store_headers(store, store_keys):
+    """X-Store-Id, plus the X-Store-Key the target expects for that store."""
+    if not store:
+        return None
+    headers = {"X-Store-Id": store}
+    if store in store_keys:
+        headers["X-Store-Key"] = store_keys[store]
+    return headers
+
+
+async def replay(records, target: str, speed: float, concurrency: int, timeout: float, store_keys=None):
+    results = [None] * len(records)
+    semaphore = asyncio.Semaphore(concurrency)
+    t0 = records[0]["ts"]
+    started = time.monotonic()
+
+    async with httpx.AsyncClient(base_url=target, timeout=timeout) as client:
+        async def fire(i, record):
+            delay = (record["ts"] - t0) / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            async with semaphore:
+                url = record["path"] + (f"?{record['query']}" if record["query"] else "")
+                begin = time.perf_counter()
+                try:
+                    response = await client.request(
+                        record["method"], url,
+                        json=record["body"] if record["body"] is not None else None,
+                        headers=store_headers(record.get("store"), store_keys or {}),
+                    )
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = 0
+                results[i] = (status, (time.perf_counter() - begin) * 1000)
+
+        await asyncio.gather(*(fire(i, r) for i, r in enumerate(records)))
+    return results
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+
+
+def is_error(status: int) -> bool:
+    return status == 0 or status >= 500
+
+
+def report(records, results):
+    by_route = defaultdict(lambda: {"rec": [], "rep": [], "rec_err": 0, "rep_err": 0, "mismatch": 0})
+    for record, (status, latency) in zip(records, results):
+        row = by_route[route_of(record["method"], record["path"])]
+        row["rec"].append(record["duration_ms"])
+        row["rep"].append(latency)
+        row["rec_err"] += is_error(record["status"])
+        row["rep_err"] += is_error(status)
+        row["mismatch"] += status != record["status"]
+
+    header = f"{'route':<36} {'n':>6} {'p50 rec':>8} {'p50 rep':>8} {'p95 rec':>8} {'p95 rep':>8} {'p99 Δ%':>7} {'err rec':>7} {'err rep':>7} {'status≠':>7}"
+    print(header)
+    print("-" * len(header))
+    for route, row in sorted(by_route.items(), key=lambda kv: -len(kv[1]["rec"])):
+        rec99, rep99 = pct(row["rec"], 99), pct(row["rep"], 99)
+        delta = (rep99 - rec99) / rec99 * 100 if rec99 else 0.0
+        print(
+            f"{route[:36]:<36} {len(row['rec']):>6} "
+            f"{statistics.median(row['rec']):>8.1f} {statistics.median(row['rep']):>8.1f} "
+            f"{pct(row['rec'], 95):>8.1f} {pct(row['rep'], 95):>8.1f} {delta:>+7.0f} "
+            f"{row['rec_err']:>7} {row['rep_err']:>7} {row['mismatch']:>7}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay captured request traces")
+    parser.add_argument("traces", nargs="+", help="trace files or glob patterns")
+    parser.add_argument("--target", default="http://localhost:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = real time, 4 = four times faster")
+    parser.add_argument("--concurrency", type=int, default=256, help="max requests in flight")
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--store-keys", default="",
+                        help="X-Store-Key per store on the target, as in its store_keys (2:<secret>,3:<secret>)")
+    args = parser.parse_args(argv)
+
+    records = [r for r in load(args.traces) if replayable(r)]
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        print("No replayable requests found")
+        return 1
+
+    span = records[-1]["ts"] - records[0]["ts"]
+    print(f"Replaying {len(records)} requests spanning {span:.0f}s at {args.speed}x against {args.target}\n")
+    wall = time.monotonic()
+    store_keys = dict(entry.strip().split(":", 1) for entry in args.store_keys.split(",") if entry.strip())
+    results = asyncio.run(replay(records, args.target, args.speed, args.concurrency, args.timeout, store_keys))
+    print(f"Finished in {time.monotonic() - wall:.1f}s\n")
+    report(records, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+#restock_report.py runs the demand forecast for every variant and prints (or
+#writes as CSV) the ones that should be reordered.
+#
+#   cd app && python -m scripts.restock_report [--store 1] [--all] [--csv restock.csv]
+import argparse
+import csv
+import sys
+import time
+
+from crud.forecast_crud import build_forecast
+import stores
+from database import SessionLocal
+
+COLUMNS = [
+    "variant_id", "product_id", "name", "color", "size", "stock", "units_sold",
+    "ma_7", "ma_28", "daily_demand", "sell_through", "days_of_stock",
+    "reorder_point", "reorder_qty",
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Demand forecast and reorder quantities")
+    parser.add_argument("--store", type=int, default=stores.DEFAULT_STORE_ID, help="store (branch) to forecast")
+    parser.add_argument("--all", action="store_true", help="include variants that don't need a reorder")
+    parser.add_argument("--csv", help="write rows to this CSV file instead of printing")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    with SessionLocal(info={"store_id": args.store}) as db:
+        rows = build_forecast(db)
+    elapsed = time.perf_counter() - started
+    if not args.all:
+        rows = [r for r in rows if r["reorder_qty"] > 0]
+    rows.sort(key=lambda r: (r["days_of_stock"] is None, r["days_of_stock"] or 0))
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        print(f"{'variant':>8} {'product':<24} {'size':<6} {'stock':>6} {'/day':>7} {'days left':>9} {'reorder':>8}")
+        for r in rows:
+            label = " ".join(filter(None, [r["name"], r["color"]]))[:24]
+            days = "-" if r["days_of_stock"] is None else f"{r['days_of_stock']:.1f}"
+            print(
+                f"{r['variant_id']:>8} {label:<24} {(r['size'] or '')[:6]:<6} {r['stock']:>6} "
+                f"{r['daily_demand']:>7.2f} {days:>9} {r['reorder_qty']:>8}"
+            )
+    print(f"{len(rows)} variants, forecast computed in {elapsed:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
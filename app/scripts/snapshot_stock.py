@@ -0,0 +1,29 @@
+#snapshot_stock.py records every variant's current quantity in stock_snapshots.
+#Point-in-time stock (GET /stock?at=) starts from the newest snapshot before
+#the requested time and replays only the ledger after it, so run this
+#regularly, e.g. nightly from cron. Ledger writes wait for the moment it runs.
+#
+#   cd app && python -m scripts.snapshot_stock [--store 1]
+import argparse
+import sys
+
+import models
+from crud.stock_crud import take_snapshot
+from database import SessionLocal, engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Snapshot current stock per variant")
+    parser.add_argument("--store", type=int, help="only this store (default: every store)")
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine)
+    info = {} if args.store is None else {"store_id": args.store}
+    with SessionLocal(info=info) as db:
+        count = take_snapshot(db)
+    print(f"{count} variant(s) recorded")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+#serve.py is the production entry point: pre-forks one uvicorn worker per core.
+#
+#   cd app && python serve.py              # workers = usable cores
+#   cd app && python serve.py --workers 4
+#
+# Send SIGHUP to the parent process to restart the workers one by one
+# (graceful reload); SIGTERM/SIGINT shut everything down gracefully.
+import argparse
+import importlib.util
+import os
+
+import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Postgres connection budget shared by all workers
+PG_MAX_CONNECTIONS = int(os.getenv("pg_max_connections", "100"))
+# Connections left free for psql, migrations, cron jobs and the like
+PG_RESERVED_CONNECTIONS = int(os.getenv("pg_reserved_connections", "10"))
+# Proxies whose X-Forwarded-For/-Proto are trusted (comma-separated IPs or
+# networks, "*" for any). Anyone else could spoof the client address.
+FORWARDED_ALLOW_IPS = os.getenv("forwarded_allow_ips", "127.0.0.1")
+# Shared idempotency store (idempotency.py); required with more than one worker
+REDIS_URL = os.getenv("redis_url")
+
+
+def usable_cores() -> int:
+    try:
+        # Respects taskset/cgroup cpusets, unlike os.cpu_count()
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_workers() -> int:
+    return int(os.getenv("WEB_CONCURRENCY", usable_cores()))
+
+
+def pool_budget(workers: int) -> dict:
+    """Split the connection budget evenly between workers.
+
+    Each worker gets a fixed pool with no overflow, so the total can never
+    exceed max_connections no matter how bursty the traffic is.
+    """
+    available = PG_MAX_CONNECTIONS - PG_RESERVED_CONNECTIONS
+    per_worker = available // workers
+    if per_worker < 1:
+        raise SystemExit(
+            f"{workers} workers need at least {workers} connections but only "
+            f"{available} are available (pg_max_connections - pg_reserved_connections)"
+        )
+    return {"db_pool_size": per_worker, "db_max_overflow": 0}
+
+
+def check_idempotency_store(workers: int):
+    """Refuse to start workers that can't see each other's idempotency keys.
+
+    Without Redis every worker keeps its own keys in memory, so a retried
+    POST /orders landing on another worker would create the order twice.
+    """
+    if workers < 2:
+        return
+    if not REDIS_URL:
+        raise SystemExit(
+            f"{workers} workers need a shared idempotency store: set redis_url "
+            f"(or run with --workers 1)"
+        )
+    if importlib.util.find_spec("redis") is None:
+        raise SystemExit("redis_url is set but the redis package is not installed (pip install redis)")
+
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Inventory API with multiple workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="seconds to let in-flight requests finish on shutdown/reload")
+    parser.add_argument("--forwarded-allow-ips", default=FORWARDED_ALLOW_IPS,
+                        help="proxies trusted to set X-Forwarded-* headers")
+    args = parser.parse_args(argv)
+
+    check_idempotency_store(args.workers)
+
+    # Workers are spawned processes and inherit the environment, so this is
+    # how each of them learns its pool size before database.py is imported.
+    for key, value in pool_budget(args.workers).items():
+        os.environ[key] = str(value)
+
+    loop, http = event_loop(), http_protocol()
+    print(
+        f"Starting {args.workers} workers (loop={loop}, http={http}, "
+        f"db pool {os.environ['db_pool_size']}/worker)"
+    )
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=True,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#stock_ledger.py appends a stock_movements row for every change to a variant's
+#quantity, in the same transaction as the change, so past stock levels can be
+#reconstructed (crud/stock_crud.py) instead of only the current one.
+#
+# The ledger is append-only: nothing updates or deletes its rows. A movement
+# records the change (delta), the quantity it left behind and why:
+#
+#   sale        stock taken by an order (order_id set)
+#   restock     stock received
+#   adjustment  corrections: counts, damage, a deleted variant going to zero
+#
+# Code that changes stock for a known reason says so with reason(db, kind)
+# before flushing. Otherwise increases are recorded as restocks and decreases
+# as adjustments.
+from typing import Optional
+
+from sqlalchemy import event, inspect, insert
+from sqlalchemy.orm import Session
+
+from models import StockMovement, Variant
+
+SALE = "sale"
+RESTOCK = "restock"
+ADJUSTMENT = "adjustment"
+KINDS = (SALE, RESTOCK, ADJUSTMENT)
+
+
+def reason(db: Session, kind: str, order=None):
+    """Record the session's next stock changes as kind (and, for sales, the
+    order; its id is read once the flush has assigned it)."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown stock movement kind: {kind}")
+    db.info["stock_reason"] = (kind, order)
+
+
+def _movement(variant: Variant, before: int, after: int, kind: Optional[str], order) -> dict:
+    delta = after - before
+    if kind is None:
+        kind = RESTOCK if delta > 0 else ADJUSTMENT
+    return {
+        "store_id": variant.store_id,
+        "variant_id": variant.variant_id,
+        "kind": kind,
+        "delta": delta,
+        "quantity_after": after,
+        "order_id": order.order_id if order is not None and kind == SALE else None,
+    }
+
+
+def _movements(session: Session):
+    kind, order = session.info.get("stock_reason", (None, None))
+    rows = []
+    for obj in session.new:
+        if isinstance(obj, Variant) and obj.quantity:
+            rows.append(_movement(obj, 0, obj.quantity, kind, order))
+    for obj in session.dirty:
+        if not isinstance(obj, Variant):
+            continue
+        history = inspect(obj).attrs.quantity.history
+        if history.deleted and history.added and history.deleted[0] != history.added[0]:
+            rows.append(_movement(obj, history.deleted[0], history.added[0], kind, order))
+    for obj in session.deleted:
+        if isinstance(obj, Variant) and obj.quantity:
+            rows.append(_movement(obj, obj.quantity, 0, ADJUSTMENT, None))
+    return rows
+
+
+@event.listens_for(Session, "after_flush")
+def record_movements(session: Session, flush_context):
+    rows = _movements(session)
+    if rows:
+        session.connection().execute(insert(StockMovement.__table__), rows)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _clear_reason(session: Session, transaction):
+    if transaction.parent is None:
+        session.info.pop("stock_reason", None)
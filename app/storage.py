@@ -6,23 +6,83 @@ load_dotenv()
 
 SUPABASE_URL = os.getenv("supabase_url")
 SUPABASE_KEY = os.getenv("supabase_key")
-SUPABASE_BUCKET = os.getenv("supabase_bucket") 
+SUPABASE_BUCKET = os.getenv("supabase_bucket")
+
+# "supabase" (default) or "local" to store files on disk, e.g. for development
+STORAGE_BACKEND = os.getenv("storage_backend", "supabase")
+LOCAL_STORAGE_DIR = os.getenv("local_storage_dir", "local_storage")
+LOCAL_STORAGE_URL = os.getenv("local_storage_url", "http://localhost:8000/local-storage")
 
-async def upload_image_to_supabase(file_name: str, file_content: bytes, content_type: str):
-    file_path = f"product_images/{file_name}"
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{SUPABASE_URL}/storage/v1/object/{SUPABASE_BUCKET}/{file_path}",
-            headers={
-                "apikey": SUPABASE_KEY,
-                "Authorization": f"Bearer {SUPABASE_KEY}",
-                "Content-Type": content_type
-            },
-            content=file_content
-        )
-
-    if response.status_code in [200, 201]:
+class SupabaseStorage:
+    def public_url(self, file_path: str) -> str:
         return f"{SUPABASE_URL}/storage/v1/object/public/{SUPABASE_BUCKET}/{file_path}"
-    else:
-        raise Exception(f"Failed to upload image: {response.text}")
+
+    async def exists(self, file_path: str) -> bool:
+        async with httpx.AsyncClient() as client:
+            response = await client.head(self.public_url(file_path))
+        return response.status_code == 200
+
+    async def upload(self, file_path: str, file_content: bytes, content_type: str, upsert: bool = False) -> str:
+        headers = {
+            "apikey": SUPABASE_KEY,
+            "Authorization": f"Bearer {SUPABASE_KEY}",
+            "Content-Type": content_type
+        }
+        if upsert:
+            headers["x-upsert"] = "true"
+
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                f"{SUPABASE_URL}/storage/v1/object/{SUPABASE_BUCKET}/{file_path}",
+                headers=headers,
+                content=file_content
+            )
+
+        if response.status_code in [200, 201]:
+            return self.public_url(file_path)
+        else:
+            raise Exception(f"Failed to upload image: {response.text}")
+
+
+class LocalStorage:
+    """Stand-in for Supabase that writes under local_storage_dir (served by
+    main.py at /local-storage)."""
+
+    def __init__(self, root: str = LOCAL_STORAGE_DIR, base_url: str = LOCAL_STORAGE_URL):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def _path(self, file_path: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, file_path))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid storage path: {file_path}")
+        return path
+
+    def public_url(self, file_path: str) -> str:
+        return f"{self.base_url}/{file_path}"
+
+    async def exists(self, file_path: str) -> bool:
+        return os.path.exists(self._path(file_path))
+
+    async def upload(self, file_path: str, file_content: bytes, content_type: str, upsert: bool = False) -> str:
+        path = self._path(file_path)
+        if os.path.exists(path) and not upsert:
+            raise Exception(f"Failed to upload image: {file_path} already exists")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(file_content)
+        os.replace(tmp_path, path)
+        return self.public_url(file_path)
+
+
+def get_storage():
+    if STORAGE_BACKEND == "local":
+        return LocalStorage()
+    return SupabaseStorage()
+
+
+async def upload_image_to_supabase(file_name: str, file_content: bytes, content_type: str):
+    file_path = f"product_images/{file_name}"
+    return await SupabaseStorage().upload(file_path, file_content, content_type)
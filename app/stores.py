@@ -0,0 +1,100 @@
+#stores.py scopes sessions to one shop branch (store).
+#
+# Products and services are a shared catalog. Stock (variants), orders, order
+# items, payments, sales records, cashouts, the stock ledger and the read
+# models built from them carry a store_id. A session opened with
+# info={"store_id": n} only sees rows of store n: every ORM
+# SELECT/UPDATE/DELETE it runs gets a store_id criterion, and new rows are
+# stamped with the store on flush.
+# Sessions without a store_id (scripts, maintenance jobs) see every store.
+#
+# Stores are configured, not discovered: store_keys=2:<secret>,3:<secret>
+# lists the other branches and the X-Store-Key each must send. The default
+# store needs no key unless one is listed for it too.
+import hmac
+import os
+from functools import lru_cache
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.orm import Session, with_loader_criteria
+
+from models import (
+    CashoutTransaction, Counter, DailyCashBucket, Order, OrderArchive, OrderItem,
+    OrderItemArchive, OrderPayment, OrderPaymentArchive, OrderSummary,
+    SalesRecord, StockMovement, StockSnapshot, Variant,
+)
+
+load_dotenv()
+
+# Requests without an X-Store-Id header belong to this store
+DEFAULT_STORE_ID = int(os.getenv("default_store_id", "1"))
+
+
+def parse_store_keys(value: Optional[str]) -> Dict[int, str]:
+    keys = {}
+    for entry in (value or "").split(","):
+        if entry.strip():
+            store_id, _, key = entry.partition(":")
+            keys[int(store_id)] = key.strip()
+    return keys
+
+
+STORE_KEYS = parse_store_keys(os.getenv("store_keys"))
+KNOWN_STORES = frozenset({DEFAULT_STORE_ID, *STORE_KEYS})
+
+STORE_SCOPED = (
+    Variant, Order, OrderItem, OrderPayment, SalesRecord, CashoutTransaction,
+    OrderSummary, DailyCashBucket, OrderArchive, OrderItemArchive, OrderPaymentArchive,
+    Counter, StockMovement, StockSnapshot,
+)
+
+
+def session_store(db: Session) -> Optional[int]:
+    """The store a session is scoped to, or None for an all-stores session."""
+    return db.info.get("store_id")
+
+
+def write_store(db: Session) -> int:
+    """Store for rows written outside the ORM (Core inserts into read models)."""
+    store_id = session_store(db)
+    return DEFAULT_STORE_ID if store_id is None else store_id
+
+
+def can_access(store_id: int, key: Optional[str]) -> bool:
+    """Whether a request may work on store_id, given its X-Store-Key."""
+    if store_id not in KNOWN_STORES:
+        return False
+    expected = STORE_KEYS.get(store_id)
+    if expected is None:
+        return True
+    return key is not None and hmac.compare_digest(key.encode(), expected.encode())
+
+
+# Loader criteria options, built once per store rather than per statement.
+# Bounded anyway, so a session scoped to an arbitrary id can't grow it.
+@lru_cache(maxsize=256)
+def store_criteria(store_id: int) -> tuple:
+    return tuple(
+        with_loader_criteria(model, lambda cls: cls.store_id == store_id, include_aliases=True)
+        for model in STORE_SCOPED
+    )
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _filter_by_store(execute_state):
+    store_id = execute_state.session.info.get("store_id")
+    if store_id is None or execute_state.is_column_load or execute_state.is_relationship_load:
+        return
+    if not (execute_state.is_select or execute_state.is_update or execute_state.is_delete):
+        return
+    execute_state.statement = execute_state.statement.options(*store_criteria(store_id))
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_store(session: Session, flush_context, instances):
+    store_id = write_store(session)
+    for obj in session.new:
+        if isinstance(obj, STORE_SCOPED) and obj.store_id is None:
+            obj.store_id = store_id
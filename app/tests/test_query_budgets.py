@@ -0,0 +1,59 @@
+#Every @query_budget route is requested with query_audit=strict (conftest.py),
+#so a route issuing more statements than its budget answers 500 with the list.
+import pytest
+
+REQUESTS = [
+    "/products",
+    "/search-product",
+    "/products/count",
+    "/products/count?include_archived=true",
+    "/services",
+    "/orders",
+    "/orders?include_archived=true",
+    "/order-summaries",
+    "/order-summaries?status=complete",
+    "/sold/count",
+    "/sold/count?include_archived=true",
+    "/order-payments",
+    "/total-payments",
+    "/total-payments?include_archived=true",
+    "/reconciliation",
+    "/reconciliation?start=2024-01-01&end=2025-12-31",
+    "/restock",
+    "/restock?only_reorder=false",
+    "/stock",
+    "/stock?at=2020-01-01T00:00:00",
+    "/stock-movements",
+    "/stock-movements?variant_id=1",
+    "/service-payments",
+    "/sync",
+    "/sync?since=0:0&limit=5000",
+]
+
+
+@pytest.fixture(scope="module")
+def app(database):
+    import main
+    return main.app
+
+
+@pytest.fixture(scope="module")
+def client(app):
+    from fastapi.testclient import TestClient
+    with TestClient(app) as client:
+        yield client
+
+
+def test_every_budgeted_route_is_requested(app):
+    budgeted = {
+        route.path for route in app.routes
+        if hasattr(getattr(route, "endpoint", None), "__query_budget__")
+    }
+    assert budgeted <= {url.split("?")[0] for url in REQUESTS}
+
+
+@pytest.mark.parametrize("url", REQUESTS)
+def test_route_stays_within_budget(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, response.text
+    assert int(response.headers["x-query-count"]) >= 1
@@ -0,0 +1,59 @@
+#Every check_query_plans case must plan without unexpected sequential scans, and
+#the selective lookups must use the index they were built for.
+import pytest
+
+# case -> index groups; the case's plans must use at least one index of each
+EXPECTED_INDEXES = {
+    "get_variants_by_product": [
+        {"products_pkey", "ix_products_product_id"},
+        {"ix_variants_store_id_product_id_size"},
+    ],
+    "get_total_payments_for_item": [{"ix_order_items_service_id"}],
+    "create_order_payment": [
+        {"orders_pkey", "ix_orders_order_id"},
+        {"ix_order_payments_order_id"},
+    ],
+    "get_sales_records": [{"ix_sales_records_store_id_date", "ix_sales_records_date"}],
+    "get_sales_record_by_date": [{"ix_sales_records_store_id_date", "ix_sales_records_date"}],
+    "get_movements": [{"ix_stock_movements_variant_id_movement_id"}],
+}
+
+
+@pytest.fixture(scope="module")
+def plans(database):
+    from scripts import check_query_plans
+    return check_query_plans
+
+
+@pytest.fixture(scope="module")
+def cases(plans):
+    from database import SessionLocal
+    with SessionLocal() as db:
+        return plans.cases(plans.sample_ids(db))
+
+
+def test_expected_cases_exist(cases):
+    assert set(EXPECTED_INDEXES) <= set(cases)
+
+
+def test_no_unexpected_sequential_scans(plans, cases):
+    failures = []
+    for name, (call, allowed_seq) in cases.items():
+        statements = plans.capture_selects(call)
+        if not statements:
+            failures.append(f"{name}: issued no SELECT")
+        for i, (statement, parameters) in enumerate(statements):
+            bad_scans = [t for t in plans.seq_scans(plans.explain(statement, parameters)) if t not in allowed_seq]
+            if bad_scans:
+                failures.append(f"{name}#{i}: sequential scan on {', '.join(bad_scans)}")
+    assert not failures, "\n".join(failures)
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED_INDEXES))
+def test_uses_expected_indexes(plans, cases, name):
+    call, _ = cases[name]
+    used = set()
+    for statement, parameters in plans.capture_selects(call):
+        used.update(plans.indexes_used(plans.explain(statement, parameters)))
+    for expected in EXPECTED_INDEXES[name]:
+        assert used & expected, f"{name}: none of {sorted(expected)} used (used: {sorted(used) or 'no index'})"
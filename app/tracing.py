@@ -0,0 +1,122 @@
+#tracing.py records sanitized request traces to a compact rotating log so real
+#traffic can be replayed offline with scripts/replay_trace.py.
+#
+#   trace_capture_path=traces/api-{pid}.jsonl  enable capture (off when unset);
+#                                              {pid} gives each worker its own file
+#   trace_capture_max_bytes=10485760            rotate after this size
+#   trace_capture_backups=5                     rotated files to keep
+#   trace_capture_sample_rate=1.0               fraction of requests to record
+#
+# One JSON object per line: ts (epoch seconds), method, path, store
+# (X-Store-Id), query, body, status and duration_ms. Other headers are not
+# recorded and body fields that look like secrets are masked.
+import json
+import logging
+import os
+import random
+import time
+from logging.handlers import RotatingFileHandler
+
+from dotenv import load_dotenv
+
+from log_config import queue_handler
+
+load_dotenv()
+
+CAPTURE_PATH = os.getenv("trace_capture_path")
+MAX_BYTES = int(os.getenv("trace_capture_max_bytes", str(10 * 1024 * 1024)))
+BACKUPS = int(os.getenv("trace_capture_backups", "5"))
+SAMPLE_RATE = float(os.getenv("trace_capture_sample_rate", "1.0"))
+ENABLED = bool(CAPTURE_PATH)
+
+# Bodies larger than this (uploads) are recorded by size only
+MAX_BODY_BYTES = 64 * 1024
+SECRET_KEYS = ("password", "token", "secret", "key", "authorization", "card")
+SKIP_PREFIXES = ("/docs", "/openapi.json", "/health", "/metrics", "/local-storage")
+
+logger = logging.getLogger("trace_capture")
+logger.propagate = False
+
+
+def configure(path: str = CAPTURE_PATH):
+    if logger.handlers:
+        return
+    path = path.replace("{pid}", str(os.getpid()))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=MAX_BYTES, backupCount=BACKUPS)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    # File writes and rotation happen on the log writer thread
+    logger.addHandler(queue_handler(handler))
+    logger.setLevel(logging.INFO)
+
+
+def sanitize(value):
+    if isinstance(value, dict):
+        return {
+            k: "***" if any(s in k.lower() for s in SECRET_KEYS) else sanitize(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [sanitize(v) for v in value]
+    return value
+
+
+def _body(raw: bytes, size: int, content_type: str):
+    if not size:
+        return None
+    if size > MAX_BODY_BYTES or not content_type.startswith("application/json"):
+        return {"_omitted_bytes": size, "_content_type": content_type}
+    try:
+        return sanitize(json.loads(raw))
+    except ValueError:
+        return {"_omitted_bytes": size, "_content_type": content_type}
+
+
+class TraceCaptureMiddleware:
+    def __init__(self, app):
+        self.app = app
+        configure()
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith(SKIP_PREFIXES)
+            or random.random() >= SAMPLE_RATE
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        ts = time.time()
+        chunks, size, status = [], 0, 500
+
+        async def recording_receive():
+            nonlocal size
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                size += len(body)
+                if size <= MAX_BODY_BYTES:
+                    chunks.append(body)
+            return message
+
+        async def recording_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, recording_receive, recording_send)
+        finally:
+            headers = dict(scope.get("headers", []))
+            logger.info(json.dumps({
+                "ts": round(ts, 4),
+                "method": scope["method"],
+                "path": scope["path"],
+                "store": headers.get(b"x-store-id", b"").decode("latin-1") or None,
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "body": _body(b"".join(chunks), size, headers.get(b"content-type", b"").decode("latin-1")),
+                "status": status,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            }, separators=(",", ":"), default=str))